@@ -6,11 +6,25 @@ Este script pega o modelo treinado e registra no Vertex AI.
 
 import os
 import sys
+import argparse
+import json
+import base64
+import logging
+import mmap
+import functools
+import hashlib
+import itertools
 import joblib
-import shutil
 import pickle
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import google_crc32c
+import google.auth
+import requests
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import aiplatform
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
 
 # Configurações
 PROJECT_ID = "mlops-484912"
@@ -18,19 +32,120 @@ REGION = "us-central1"
 BUCKET_NAME = "meu-bucket-29061999"
 MODEL_DISPLAY_NAME = "modelo-inadimplencia-gcp"
 
+# Upload: arquivos acima do limite são enviados em partes paralelas
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 8 MiB
+PARALLEL_UPLOAD_THRESHOLD = 32 * 1024 * 1024  # 32 MiB
+
 # Paths
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 MLRUNS_DIR = os.path.join(PROJECT_DIR, "mlruns")
+LATEST_MODEL_CACHE = os.path.join(SCRIPT_DIR, ".latest_model_cache.json")
 
 # Adicionar src ao path
 sys.path.append(os.path.join(PROJECT_DIR, "src"))
 
+# Detalhes por arquivo só aparecem com LOGLEVEL=DEBUG
+logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
+log = logging.getLogger(__name__)
+
+# Cliente do GCS reutilizado entre chamadas (credenciais e conexões ficam quentes)
+_STORAGE_CLIENT = None
+# Conexões HTTP mantidas no pool (>= nº de threads de upload)
+HTTP_POOL_SIZE = 32
+
+
+def _storage():
+    """Retorna o cliente do GCS, criando-o apenas na primeira chamada"""
+    global _STORAGE_CLIENT
+    if _STORAGE_CLIENT is None:
+        credentials, _ = google.auth.default(
+            scopes=["https://www.googleapis.com/auth/devstorage.read_write"]
+        )
+        session = AuthorizedSession(credentials)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE
+        )
+        session.mount("https://", adapter)
+        _STORAGE_CLIENT = storage.Client(project=PROJECT_ID, credentials=credentials, _http=session)
+    return _STORAGE_CLIENT
+
+
+@functools.lru_cache(maxsize=None)
+def _init_vertex():
+    """Inicializa o Vertex AI uma única vez"""
+    aiplatform.init(project=PROJECT_ID, location=REGION)
+
+
+def _latest_model_cache_key(mlruns_path):
+    """
+    Chave do cache: mtime do mlruns e de cada pasta de experiment.
+    Um novo experiment ou run altera o mtime e invalida o cache.
+    """
+    entries = [(mlruns_path, os.path.getmtime(mlruns_path))]
+    for entry in os.scandir(mlruns_path):
+        if entry.is_dir():
+            entries.append((entry.name, entry.stat().st_mtime))
+    return hashlib.sha256(repr(sorted(entries)).encode()).hexdigest()
+
+
+def _read_latest_model_cache(key):
+    """Retorna (model_path, run_id, accuracy) do cache, se ainda válido"""
+    try:
+        with open(LATEST_MODEL_CACHE, "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    if cached.get("key") != key or not os.path.exists(cached.get("model_path", "")):
+        return None
+    return cached["model_path"], cached["run_id"], cached["accuracy"]
+
+
+def _write_latest_model_cache(key, model_path, run_id, accuracy, mlruns_path):
+    """
+    Persiste o resultado de find_latest_model para as próximas execuções.
+    Só caminhos dentro do mlruns: temp_model.pkl e downloads temporários
+    do MLflow são apagados depois do upload.
+    """
+    mlruns_abs = os.path.abspath(mlruns_path)
+    if os.path.commonpath([os.path.abspath(model_path), mlruns_abs]) != mlruns_abs:
+        return
+    try:
+        with open(LATEST_MODEL_CACHE, "w") as f:
+            json.dump({
+                "key": key,
+                "model_path": os.path.abspath(model_path),
+                "run_id": run_id,
+                "accuracy": accuracy,
+            }, f)
+    except OSError as e:
+        print(f"   ⚠️ Não foi possível salvar cache: {e}")
+
+
+def _find_model_file(artifacts_dir):
+    """
+    Retorna o arquivo do modelo sob artifacts_dir (ou None): model.pkl /
+    model.joblib pelo nome primeiro; o run também guarda outros pickles
+    (ex.: preprocessor/preprocessor.pkl), que nunca são o modelo.
+    """
+    root = Path(artifacts_dir)
+    for name in ("model.pkl", "model.joblib"):
+        model_path = next(root.rglob(name), None)
+        if model_path:
+            return str(model_path)
+    
+    candidates = itertools.chain(root.rglob("*.pkl"), root.rglob("*.joblib"))
+    model_path = next(
+        (p for p in candidates if "preprocessor" not in p.relative_to(root).parts[:-1]),
+        None,
+    )
+    return str(model_path) if model_path else None
+
 
 def find_latest_model():
     """Encontra o modelo mais recente no MLflow"""
     import mlflow
-    import pandas as pd
     
     # Tentar diferentes caminhos possíveis
     possible_paths = [
@@ -52,6 +167,13 @@ def find_latest_model():
     if not mlruns_path:
         raise Exception("Pasta mlruns não encontrada!")
     
+    # Reutilizar resultado anterior se o mlruns não mudou
+    cache_key = _latest_model_cache_key(mlruns_path)
+    cached = _read_latest_model_cache(cache_key)
+    if cached:
+        print(f"   ⚡ Usando modelo em cache: {cached[0]}")
+        return cached
+    
     mlflow.set_tracking_uri(mlruns_path)
     
     # Listar conteúdo do mlruns para debug
@@ -73,19 +195,22 @@ def find_latest_model():
         print(f"   ⚠️ Erro ao buscar experiments: {e}")
         experiments = []
     
-    # Buscar runs em cada experiment
-    all_runs = []
-    for exp in experiments:
+    # Buscar o melhor run de todos os experiments em uma única consulta
+    runs = []
+    if experiments:
+        exp_ids = [exp.experiment_id for exp in experiments]
         try:
-            runs = mlflow.search_runs(experiment_ids=[exp.experiment_id])
-            if not runs.empty:
-                print(f"   📊 Experiment '{exp.name}': {len(runs)} runs")
-                all_runs.append(runs)
+            runs = mlflow.search_runs(
+                experiment_ids=exp_ids,
+                order_by=["metrics.accuracy DESC"],
+                max_results=1,
+                output_format="list",
+            )
         except Exception as e:
-            print(f"   ⚠️ Erro no experiment {exp.name}: {e}")
+            print(f"   ⚠️ Erro ao buscar runs: {e}")
     
     # Se não encontrou via API, tentar buscar diretamente nos diretórios
-    if not all_runs:
+    if not runs:
         print("\n   🔍 Buscando modelos diretamente nos diretórios...")
         
         # Procurar em subpastas do mlruns
@@ -99,36 +224,32 @@ def find_latest_model():
                         artifacts_path = os.path.join(run_path, "artifacts")
                         if os.path.exists(artifacts_path):
                             # Procurar modelo
-                            for root, dirs, files in os.walk(artifacts_path):
-                                for file in files:
-                                    if file.endswith(('.pkl', '.joblib')):
-                                        model_path = os.path.join(root, file)
-                                        print(f"   ✅ Modelo encontrado: {model_path}")
-                                        return model_path, run_item, 0.85  # accuracy padrão
-    
-    if not all_runs:
+                            model_path = _find_model_file(artifacts_path)
+                            if model_path:
+                                print(f"   ✅ Modelo encontrado: {model_path}")
+                                # Leitura de um único run para obter a accuracy real
+                                try:
+                                    run = mlflow.get_run(run_item)
+                                    accuracy = run.data.metrics.get("accuracy", 0.85)
+                                except Exception:
+                                    accuracy = 0.85  # accuracy padrão
+                                _write_latest_model_cache(cache_key, model_path, run_item, accuracy, mlruns_path)
+                                return model_path, run_item, accuracy
+    
+    if not runs:
         raise Exception("Nenhum run encontrado no MLflow!")
     
-    # Concatenar todos os runs e pegar o melhor
-    all_runs_df = pd.concat(all_runs, ignore_index=True)
-    
-    # Verificar se tem coluna accuracy
-    if 'metrics.accuracy' in all_runs_df.columns:
-        all_runs_df = all_runs_df.sort_values("metrics.accuracy", ascending=False)
-        accuracy = all_runs_df.iloc[0].get("metrics.accuracy", 0)
-    else:
-        accuracy = 0.85  # valor padrão
-    
-    best_run = all_runs_df.iloc[0]
-    run_id = best_run["run_id"]
-    experiment_id = best_run["experiment_id"]
-    f1 = best_run.get("metrics.f1_score", 0)
+    best_run = runs[0]
+    run_id = best_run.info.run_id
+    experiment_id = best_run.info.experiment_id
+    accuracy = best_run.data.metrics.get("accuracy", 0.85)  # valor padrão
+    f1 = best_run.data.metrics.get("f1_score")
     
     print(f"\n✅ Melhor modelo encontrado:")
     print(f"   Run ID: {run_id}")
     print(f"   Experiment ID: {experiment_id}")
     print(f"   Accuracy: {accuracy:.4f}")
-    if pd.notna(f1):
+    if f1 is not None:
         print(f"   F1-Score: {f1:.4f}")
     
     # Encontrar o arquivo do modelo
@@ -137,38 +258,30 @@ def find_latest_model():
     print(f"\n   🔍 Buscando modelo em: {artifacts_dir}")
     
     # Procurar pelo modelo
-    model_path = None
-    for root, dirs, files in os.walk(artifacts_dir):
-        for file in files:
-            if file.endswith(('.pkl', '.joblib')) or file == 'model.pkl':
-                model_path = os.path.join(root, file)
-                print(f"   ✅ Arquivo encontrado: {model_path}")
-                break
-        if model_path:
-            break
+    model_path = _find_model_file(artifacts_dir)
+    if model_path:
+        print(f"   ✅ Arquivo encontrado: {model_path}")
     
     if not model_path:
-        # Tentar carregar via MLflow com diferentes nomes de artifact
+        # Baixar o artifact via MLflow e usar o .pkl diretamente
+        # (sem desserializar e serializar o modelo de novo)
         artifact_names = ["model", "model_rfc", "model_xgb"]
         
         for artifact_name in artifact_names:
             model_uri = f"runs:/{run_id}/{artifact_name}"
-            print(f"   🔄 Tentando carregar via URI: {model_uri}")
+            print(f"   🔄 Tentando baixar via URI: {model_uri}")
             try:
-                model = mlflow.sklearn.load_model(model_uri)
-                # Salvar temporariamente
-                import joblib
-                temp_path = os.path.join(PROJECT_DIR, "temp_model.pkl")
-                joblib.dump(model, temp_path)
-                model_path = temp_path
-                print(f"   ✅ Modelo carregado via MLflow URI: {artifact_name}")
-                break
+                model_dir = mlflow.artifacts.download_artifacts(artifact_uri=model_uri)
+                model_path = _find_model_file(model_dir)
             except Exception as e:
-                print(f"   ⚠️ Não encontrado: {artifact_name}")
-                continue
+                model_path = None
+            if model_path:
+                print(f"   ✅ Modelo obtido via MLflow URI: {artifact_name}")
+                break
+            print(f"   ⚠️ Não encontrado: {artifact_name}")
         
         if not model_path:
-            # Tentar com xgboost
+            # Flavor xgboost não salva .pkl: serializar com joblib
             for artifact_name in artifact_names:
                 model_uri = f"runs:/{run_id}/{artifact_name}"
                 try:
@@ -185,45 +298,107 @@ def find_latest_model():
         if not model_path:
             raise Exception(f"Não foi possível encontrar o modelo para run {run_id}")
     
+    _write_latest_model_cache(cache_key, model_path, run_id, accuracy, mlruns_path)
     return model_path, run_id, accuracy
 
 
-def prepare_model_for_vertex(model_path, output_dir):
+def _local_crc32c(local_path):
+    """CRC32C do arquivo local, no formato base64 usado pelo GCS"""
+    checksum = google_crc32c.Checksum()
+    with open(local_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            checksum.update(chunk)
+    return base64.b64encode(checksum.digest()).decode("utf-8")
+
+
+def _upload_file(bucket, local_path, blob_path):
     """
-    Prepara o modelo no formato que o Vertex AI espera.
-    Vertex AI precisa de um diretório com model.pkl
+    Envia um único arquivo para o bucket (executado em thread).
+    Retorna False se o objeto já existe no GCS com o mesmo conteúdo.
     """
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Copiar modelo
-    dest_path = os.path.join(output_dir, "model.pkl")
-    shutil.copy(model_path, dest_path)
-    
-    print(f"✅ Modelo preparado em: {output_dir}")
-    return output_dir
+    # Conteúdo idêntico já no bucket (mesmo CRC32C): não reenviar
+    existing = bucket.get_blob(blob_path)
+    if existing is not None and existing.crc32c == _local_crc32c(local_path):
+        log.debug("Já atualizado: gs://%s/%s", BUCKET_NAME, blob_path)
+        return False
+    
+    blob = bucket.blob(blob_path)
+    # chunk_size ativa o upload resumable (evita timeout em arquivos grandes)
+    blob.chunk_size = UPLOAD_CHUNK_SIZE
+    
+    size = os.path.getsize(local_path)
+    if size > PARALLEL_UPLOAD_THRESHOLD:
+        # Modelos grandes: partes enviadas em paralelo e compostas no GCS
+        transfer_manager.upload_chunks_concurrently(
+            local_path, blob,
+            chunk_size=UPLOAD_CHUNK_SIZE,
+            max_workers=8
+        )
+    elif size == 0:
+        # mmap não aceita arquivos vazios
+        blob.upload_from_filename(local_path)
+    else:
+        # mmap: o page cache do SO serve o buffer, sem copiar o arquivo para a memória
+        with open(local_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                blob.upload_from_file(mm, size=len(mm), content_type="application/octet-stream")
+    log.debug("Uploaded: gs://%s/%s", BUCKET_NAME, blob_path)
+    return True
 
 
-def upload_to_gcs(local_dir, gcs_path):
-    """Faz upload do modelo para o GCS"""
-    storage_client = storage.Client(project=PROJECT_ID)
-    bucket = storage_client.bucket(BUCKET_NAME)
-    
-    for root, dirs, files in os.walk(local_dir):
-        for file in files:
-            local_path = os.path.join(root, file)
-            blob_path = f"{gcs_path}/{file}"
-            blob = bucket.blob(blob_path)
-            blob.upload_from_filename(local_path)
-            print(f"✅ Uploaded: gs://{BUCKET_NAME}/{blob_path}")
+def _iter_files(path):
+    """Percorre um diretório recursivamente com os.scandir, gerando caminhos de arquivos"""
+    for entry in os.scandir(path):
+        if entry.is_dir():
+            yield from _iter_files(entry.path)
+        else:
+            yield entry.path
+
+
+def _iter_upload_tasks(local_files, gcs_path):
+    """Gera pares (caminho_local, blob_path); diretórios são expandidos"""
+    for name, local_path in local_files.items():
+        if os.path.isdir(local_path):
+            for file_path in _iter_files(local_path):
+                rel_path = os.path.relpath(file_path, local_path).replace(os.sep, "/")
+                yield file_path, f"{gcs_path}/{name}/{rel_path}"
+        else:
+            yield local_path, f"{gcs_path}/{name}"
+
+
+def upload_to_gcs(local_files, gcs_path):
+    """
+    Faz upload do modelo para o GCS.
     
-    return f"gs://{BUCKET_NAME}/{gcs_path}"
+    local_files: dict {nome_no_gcs: caminho_local}. O caminho pode ser um
+    arquivo ou um diretório. Os arquivos são enviados direto da origem,
+    sem cópia para diretório temporário.
+    """
+    bucket = _storage().bucket(BUCKET_NAME)
+    
+    # Uploads são I/O-bound: várias conexões HTTPS em paralelo
+    max_workers = min(16, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_upload_file, bucket, local_path, blob_path)
+            for local_path, blob_path in _iter_upload_tasks(local_files, gcs_path)
+        ]
+        
+        # .result() propaga qualquer erro de upload
+        uploaded = sum(future.result() for future in futures)
+    
+    artifact_uri = f"gs://{BUCKET_NAME}/{gcs_path}"
+    print(f"✅ {uploaded} arquivo(s) enviados para {artifact_uri}")
+    if uploaded < len(futures):
+        print(f"   ⚡ {len(futures) - uploaded} arquivo(s) já estavam atualizados no GCS")
+    return artifact_uri
 
 
 def register_model_in_vertex(artifact_uri, model_name, accuracy):
     """Registra o modelo no Vertex AI Model Registry"""
     
     # Inicializar Vertex AI
-    aiplatform.init(project=PROJECT_ID, location=REGION)
+    _init_vertex()
     
     # Upload do modelo
     # Usando container de sklearn pré-construído
@@ -246,32 +421,65 @@ def register_model_in_vertex(artifact_uri, model_name, accuracy):
     return model
 
 
+def _mlruns_mtime(mlruns_path):
+    """Último mtime do mlruns e das pastas de experiment (muda a cada novo run)"""
+    mtimes = [os.path.getmtime(mlruns_path)]
+    mtimes += [entry.stat().st_mtime for entry in os.scandir(mlruns_path) if entry.is_dir()]
+    return max(mtimes)
+
+
+def get_registered_model_if_fresh():
+    """
+    Retorna o modelo já registrado se .model_resource_name for mais novo
+    que o mlruns (nenhum treino novo desde o último upload).
+    """
+    resource_file = os.path.join(SCRIPT_DIR, ".model_resource_name")
+    if not os.path.exists(resource_file) or not os.path.exists(MLRUNS_DIR):
+        return None
+    if os.path.getmtime(resource_file) <= _mlruns_mtime(MLRUNS_DIR):
+        return None
+    
+    with open(resource_file, "r") as f:
+        resource_name = f.read().strip()
+    _init_vertex()
+    return aiplatform.Model(resource_name)
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Upload do modelo para o Vertex AI Model Registry")
+    parser.add_argument("--force", action="store_true",
+                        help="Refaz o upload mesmo se o modelo registrado estiver atualizado")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("🚀 UPLOAD DO MODELO PARA VERTEX AI MODEL REGISTRY")
     print("=" * 60)
     
+    # 0. Reaproveitar o modelo já registrado se não houve treino novo
+    if not args.force:
+        model = get_registered_model_if_fresh()
+        if model is not None:
+            print(f"\n⚡ Modelo já registrado e atualizado (cache): {model.resource_name}")
+            print("   Use --force para refazer o upload.")
+            return model
+    
     # 1. Encontrar o melhor modelo
     print("\n📌 Passo 1: Encontrando o melhor modelo...")
     model_path, run_id, accuracy = find_latest_model()
     print(f"   Modelo encontrado: {model_path}")
     
-    # 2. Preparar modelo
-    print("\n📌 Passo 2: Preparando modelo para Vertex AI...")
-    temp_dir = os.path.join(PROJECT_DIR, "temp_model_vertex")
-    prepare_model_for_vertex(model_path, temp_dir)
-    
-    # 3. Upload para GCS
-    print("\n📌 Passo 3: Fazendo upload para GCS...")
+    # 2. Upload para GCS
+    # Vertex AI espera um diretório com model.pkl: o arquivo de origem
+    # é enviado direto com esse nome, sem cópia local intermediária
+    print("\n📌 Passo 2: Fazendo upload para GCS...")
     gcs_path = f"models/inadimplencia/{run_id}"
-    artifact_uri = upload_to_gcs(temp_dir, gcs_path)
+    artifact_uri = upload_to_gcs({"model.pkl": model_path}, gcs_path)
     
-    # 4. Registrar no Vertex AI
-    print("\n📌 Passo 4: Registrando no Vertex AI Model Registry...")
+    # 3. Registrar no Vertex AI
+    print("\n📌 Passo 3: Registrando no Vertex AI Model Registry...")
     model = register_model_in_vertex(artifact_uri, MODEL_DISPLAY_NAME, accuracy)
     
     # Limpar temp
-    shutil.rmtree(temp_dir, ignore_errors=True)
     if os.path.exists(os.path.join(PROJECT_DIR, "temp_model.pkl")):
         os.remove(os.path.join(PROJECT_DIR, "temp_model.pkl"))
     
@@ -5,7 +5,7 @@ Este script cria um endpoint no Vertex AI que serve o modelo como API.
 """
 
 import os
-from google.cloud import aiplatform
+import functools
 
 # Configurações
 PROJECT_ID = "mlops-484912"
@@ -20,9 +20,17 @@ MAX_REPLICAS = 3  # Auto-scaling até 3 réplicas
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
+@functools.lru_cache(maxsize=None)
+def _init_vertex():
+    """Importa e inicializa o Vertex AI uma única vez (import tardio: SDK é pesado)"""
+    from google.cloud import aiplatform
+    aiplatform.init(project=PROJECT_ID, location=REGION)
+    return aiplatform
+
+
 def get_model():
     """Busca o modelo registrado no Vertex AI"""
-    aiplatform.init(project=PROJECT_ID, location=REGION)
+    aiplatform = _init_vertex()
     
     # Tentar ler o resource name salvo
     resource_file = os.path.join(SCRIPT_DIR, ".model_resource_name")
@@ -35,22 +43,29 @@ def get_model():
         return model
     
     # Se não existir, buscar pelo nome
-    models = aiplatform.Model.list(
-        filter=f'display_name="modelo-inadimplencia-gcp"',
-        order_by="create_time desc"
+    # Model.list não aceita page_size: o client GAPIC pede só o mais recente
+    client = aiplatform.gapic.ModelServiceClient(
+        client_options={"api_endpoint": f"{REGION}-aiplatform.googleapis.com"}
     )
-    
-    if not models:
+    pager = client.list_models(request={
+        "parent": f"projects/{PROJECT_ID}/locations/{REGION}",
+        "filter": 'display_name="modelo-inadimplencia-gcp"',
+        "order_by": "create_time desc",
+        "page_size": 1,
+    })
+    latest = next(iter(pager), None)
+    
+    if latest is None:
         raise Exception("Nenhum modelo encontrado! Execute 01_upload_model_to_vertex.py primeiro.")
     
-    model = models[0]
+    model = aiplatform.Model(latest.name)
     print(f"✅ Modelo encontrado: {model.display_name}")
     return model
 
 
 def create_endpoint():
     """Cria um novo endpoint"""
-    aiplatform.init(project=PROJECT_ID, location=REGION)
+    aiplatform = _init_vertex()
     
     # Verificar se já existe
     endpoints = aiplatform.Endpoint.list(
@@ -5,21 +5,36 @@ Este script testa o endpoint fazendo predições via API.
 """
 
 import os
+import functools
 import json
-import pandas as pd
-from google.cloud import aiplatform
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 # Configurações
 PROJECT_ID = "mlops-484912"
 REGION = "us-central1"
 
+# Máximo de instâncias por chamada ao endpoint
+VERTEX_MAX_BATCH = 100
+
+# Nº de chamadas do teste de latência (0 = desativado)
+BENCHMARK_REQUESTS = int(os.environ.get("BENCHMARK_REQUESTS", "0"))
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 
 
+@functools.lru_cache(maxsize=None)
+def _init_vertex():
+    """Importa e inicializa o Vertex AI uma única vez (import tardio: SDK é pesado)"""
+    from google.cloud import aiplatform
+    aiplatform.init(project=PROJECT_ID, location=REGION)
+    return aiplatform
+
+
 def get_endpoint():
     """Busca o endpoint criado"""
-    aiplatform.init(project=PROJECT_ID, location=REGION)
+    aiplatform = _init_vertex()
     
     # Ler resource name salvo
     resource_file = os.path.join(SCRIPT_DIR, ".endpoint_resource_name")
@@ -92,19 +107,76 @@ def prepare_test_data():
     return test_samples
 
 
+def _to_matrix(instances):
+    """
+    Converte para formato que Vertex AI espera.
+    Vertex AI espera lista de listas (matriz)
+    """
+    # Ordem das features fixada uma vez a partir da primeira amostra
+    feature_names = list(instances[0])
+    return np.asarray(
+        [[instance[name] for name in feature_names] for instance in instances],
+        dtype=np.float32
+    )
+
+
 def predict(endpoint, instances):
     """Faz predição via endpoint"""
     
-    # Converter para formato que Vertex AI espera
-    # Vertex AI espera lista de listas (matriz)
-    instances_list = []
-    for instance in instances:
-        instances_list.append(list(instance.values()))
+    arr = _to_matrix(instances)
+    
+    # Uma chamada por lote; lotes grandes são divididos e enviados em paralelo
+    batches = [
+        arr[i:i + VERTEX_MAX_BATCH].tolist()
+        for i in range(0, len(arr), VERTEX_MAX_BATCH)
+    ]
+    if len(batches) == 1:
+        return endpoint.predict(instances=batches[0]).predictions
+    
+    with ThreadPoolExecutor(max_workers=min(8, len(batches))) as executor:
+        responses = executor.map(lambda batch: endpoint.predict(instances=batch), batches)
+        return [pred for response in responses for pred in response.predictions]
+
+
+def benchmark_latency(endpoint, instances, n_requests):
+    """
+    Mede a latência do endpoint chamando a API REST diretamente.
+    
+    O corpo JSON é serializado uma única vez e enviado por uma sessão
+    HTTP com keep-alive, sem o overhead do SDK a cada chamada.
+    """
+    import time
+    import orjson
+    import requests
+    import google.auth
+    from google.auth.transport.requests import Request
+    
+    credentials, _ = google.auth.default(
+        scopes=["https://www.googleapis.com/auth/cloud-platform"]
+    )
+    url = f"https://{REGION}-aiplatform.googleapis.com/v1/{endpoint.resource_name}:predict"
+    body = orjson.dumps({"instances": _to_matrix(instances).tolist()})
     
-    # Fazer predição
-    response = endpoint.predict(instances=instances_list)
+    session = requests.Session()
+    session.headers["Content-Type"] = "application/json"
     
-    return response.predictions
+    latencies = []
+    for _ in range(n_requests):
+        # Renova o token só quando necessário
+        if not credentials.valid:
+            credentials.refresh(Request())
+            session.headers["Authorization"] = f"Bearer {credentials.token}"
+        
+        start = time.perf_counter()
+        response = session.post(url, data=body)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+    
+    latencies = np.asarray(latencies)
+    print(f"✅ {n_requests} requisições")
+    print(f"   p50: {np.percentile(latencies, 50):.1f} ms")
+    print(f"   p95: {np.percentile(latencies, 95):.1f} ms")
+    return latencies
 
 
 def main():
@@ -134,7 +206,16 @@ def main():
         
         labels = ["✅ Adimplente", "⚠️ Inadimplente"]
         
-        for i, (data, pred) in enumerate(zip(test_data, predictions)):
+        # Predição pode ser int ou lista de probabilidades (vetorizado)
+        pred_array = np.asarray(predictions)
+        if pred_array.ndim == 2:
+            classes = pred_array.argmax(axis=1)
+            probs = pred_array.max(axis=1)
+        else:
+            classes = pred_array.astype(int)
+            probs = [None] * len(classes)
+        
+        for i, (data, pred_class, prob) in enumerate(zip(test_data, classes, probs)):
             print(f"\n{'='*40}")
             print(f"Cliente {i+1}:")
             print(f"  - Idade: {data['idade']}")
@@ -142,14 +223,6 @@ def main():
             print(f"  - Score Crédito: {data['score_credito']}")
             print(f"  - Valor Empréstimo: R$ {data['valor_emprestimo']:,.2f}")
             
-            # Predição pode ser int ou lista de probabilidades
-            if isinstance(pred, list):
-                pred_class = 1 if pred[1] > 0.5 else 0
-                prob = max(pred)
-            else:
-                pred_class = int(pred)
-                prob = None
-            
             print(f"\n  🎯 Predição: {labels[pred_class]}")
             if prob:
                 print(f"  📊 Confiança: {prob:.2%}")
@@ -173,6 +246,11 @@ curl -X POST \\
   }}'
 """)
     
+    # 4. (Opcional) Teste de latência
+    if BENCHMARK_REQUESTS > 0:
+        print(f"\n📌 Passo 4: Medindo latência ({BENCHMARK_REQUESTS} requisições)...")
+        benchmark_latency(endpoint, test_data, BENCHMARK_REQUESTS)
+    
     print("\n" + "=" * 60)
     print("✅ TESTE CONCLUÍDO!")
     print("=" * 60)
@@ -11,7 +11,8 @@ para fazer predições usando o modelo do Vertex AI.
 CLOUD_FUNCTION_CODE = '''
 import functions_framework
 from google.cloud import aiplatform
-import json
+import numpy as np
+import orjson
 
 PROJECT_ID = "mlops-484912"
 REGION = "us-central1"
@@ -21,6 +22,14 @@ ENDPOINT_ID = "SEU_ENDPOINT_ID"  # Substituir pelo ID real
 aiplatform.init(project=PROJECT_ID, location=REGION)
 endpoint = None
 
+# Headers CORS montados uma vez, no import
+_CORS_PREFLIGHT = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'POST',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+_CORS = {'Access-Control-Allow-Origin': '*'}
+
 def get_endpoint():
     global endpoint
     if endpoint is None:
@@ -42,61 +51,62 @@ def predict(request):
     
     # Permitir CORS
     if request.method == 'OPTIONS':
-        headers = {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'POST',
-            'Access-Control-Allow-Headers': 'Content-Type',
-        }
-        return ('', 204, headers)
+        return ('', 204, _CORS_PREFLIGHT)
     
-    headers = {'Access-Control-Allow-Origin': '*'}
+    headers = _CORS
     
     try:
         # Pegar dados do request
-        request_json = request.get_json(silent=True)
+        try:
+            request_json = orjson.loads(request.get_data())
+        except orjson.JSONDecodeError:
+            request_json = None
         
-        if not request_json or 'instances' not in request_json:
-            return (json.dumps({
+        instances = request_json.get('instances') if isinstance(request_json, dict) else None
+        if instances is None:
+            return (orjson.dumps({
                 "error": "Formato inválido. Envie: {'instances': [[...]]}"
-            }), 400, headers)
-        
-        instances = request_json['instances']
+            }).decode(), 400, headers)
         
         # Fazer predição
         ep = get_endpoint()
         response = ep.predict(instances=instances)
         
-        # Formatar resposta
-        predictions = []
-        for i, pred in enumerate(response.predictions):
-            if isinstance(pred, list):
-                pred_class = 1 if pred[1] > 0.5 else 0
-                probability = max(pred)
-            else:
-                pred_class = int(pred)
-                probability = None
-            
-            predictions.append({
+        # Formatar resposta (vetorizado com NumPy)
+        arr = np.asarray(response.predictions)
+        if arr.ndim == 2:
+            classes = arr.argmax(axis=1).tolist()
+            probabilities = arr.max(axis=1).tolist()
+        else:
+            classes = arr.astype(int).tolist()
+            probabilities = [None] * len(classes)
+        
+        predictions = [
+            {
                 "prediction": "inadimplente" if pred_class == 1 else "adimplente",
                 "class": pred_class,
                 "probability": probability
-            })
+            }
+            for pred_class, probability in zip(classes, probabilities)
+        ]
         
-        return (json.dumps({
+        return (orjson.dumps({
             "success": True,
             "predictions": predictions
-        }), 200, headers)
+        }).decode(), 200, headers)
         
     except Exception as e:
-        return (json.dumps({
+        return (orjson.dumps({
             "error": str(e)
-        }), 500, headers)
+        }).decode(), 500, headers)
 '''
 
 # requirements.txt para Cloud Function
 REQUIREMENTS = '''
 functions-framework==3.*
 google-cloud-aiplatform>=1.38.0
+orjson>=3.9
+numpy>=1.21
 '''
 
 
@@ -3,34 +3,294 @@ API REST para servir o modelo de inadimplência usando FastAPI.
 Deploy via Cloud Run - mais flexível e comum em produção.
 """
 
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import joblib
+import json
 import numpy as np
 import os
 from typing import List, Optional
 
-app = FastAPI(
-    title="API de Predição de Inadimplência",
-    description="Modelo de ML para prever inadimplência de clientes",
-    version="1.0.0"
-)
-
 # Carregar modelo na inicialização
+# Se existir a versão ONNX (int8 ou float32), ela é usada (ONNX Runtime); senão, o pickle
 MODEL_PATH = os.environ.get("MODEL_PATH", "model/model.pkl")
+ONNX_MODEL_PATH = os.environ.get("ONNX_MODEL_PATH", "model/model.onnx")
+ONNX_INT8_MODEL_PATH = os.environ.get("ONNX_INT8_MODEL_PATH", "model/model.int8.onnx")
+ORT_INTRA_OP_THREADS = int(os.environ.get("ORT_INTRA_OP_THREADS", os.cpu_count() or 1))
 model = None
 
-@app.on_event("startup")
-async def load_model():
-    global model
+# Micro-batching do /predict: requisições que chegam dentro da janela
+# MAX_WAIT_MS são agrupadas (até MAX_BATCH) em uma única chamada ao modelo
+MAX_BATCH = int(os.environ.get("MAX_BATCH", "64"))
+MAX_WAIT_MS = float(os.environ.get("MAX_WAIT_MS", "5"))
+batch_queue = None
+
+# Entrada em float32 (dtype usado internamente pelos modelos de árvore) e
+# buffer pré-alocado para o lote, reutilizado a cada chamada.
+# MODEL_DTYPE=float64 para modelos treinados/avaliados em float64
+MODEL_DTYPE = np.dtype(os.environ.get("MODEL_DTYPE", "float32"))
+n_features = None
+batch_buffer = None
+
+# Cache LRU de predições por vetor de features: o tráfego costuma repetir
+# poucos vetores, que passam a não chamar o modelo (0 desativa)
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "4096"))
+# Lotes maiores que isso não usam o cache (scoring em massa raramente repete linhas)
+PREDICTION_CACHE_MAX_BATCH = int(os.environ.get("PREDICTION_CACHE_MAX_BATCH", "256"))
+prediction_cache = OrderedDict()
+cache_lock = threading.Lock()
+
+class OnnxModel:
+    """
+    Modelo ONNX com a mesma interface usada do sklearn
+    (predict, predict_proba, classes_, n_features_in_).
+    """
+    
+    def __init__(self, path):
+        import onnxruntime as ort
+        
+        so = ort.SessionOptions()
+        so.intra_op_num_threads = ORT_INTRA_OP_THREADS
+        self.session = ort.InferenceSession(path, sess_options=so, providers=["CPUExecutionProvider"])
+        
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        n = model_input.shape[1]
+        self.n_features_in_ = n if isinstance(n, int) else None
+        
+        # Classes gravadas nos metadados pelo deploy_cloud_run.py
+        classes = self.session.get_modelmeta().custom_metadata_map.get("classes")
+        self.classes_ = np.asarray(json.loads(classes)) if classes else None
+    
+    def _run(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.session.run(None, {self.input_name: X})
+    
+    def predict(self, X):
+        return self._run(X)[0]
+    
+    def predict_proba(self, X):
+        return self._run(X)[1]
+
+
+def _find_onnx_model():
+    """Prioridade: ONNX int8 -> ONNX float32 (None se não houver ONNX)"""
+    return next(
+        (p for p in (ONNX_INT8_MODEL_PATH, ONNX_MODEL_PATH) if os.path.exists(p)),
+        None
+    )
+
+
+def _load_model_sync():
+    global model, n_features, batch_buffer
     try:
-        model = joblib.load(MODEL_PATH)
-        print(f"✅ Modelo carregado de: {MODEL_PATH}")
+        onnx_path = _find_onnx_model()
+        if onnx_path:
+            model = OnnxModel(onnx_path)
+            print(f"✅ Modelo ONNX carregado de: {onnx_path}")
+        else:
+            # Arrays numpy do modelo mapeados do arquivo (page cache compartilhado
+            # entre workers) em vez de copiados para o heap
+            model = joblib.load(MODEL_PATH, mmap_mode='r')
+            print(f"✅ Modelo carregado de: {MODEL_PATH}")
+        n_features = getattr(model, "n_features_in_", None)
+        if n_features is not None:
+            batch_buffer = np.empty((MAX_BATCH, n_features), dtype=MODEL_DTYPE)
     except Exception as e:
         print(f"❌ Erro ao carregar modelo: {e}")
         raise e
 
 
+async def load_model():
+    # Já carregado no processo master (gunicorn --preload): nada a fazer
+    if model is None:
+        _load_model_sync()
+
+
+# Com gunicorn --preload, o pickle é carregado uma vez no master e os workers
+# herdam as páginas por copy-on-write após o fork (RAM não cresce por worker).
+# A sessão ONNX não é fork-safe: é criada em cada worker, no lifespan, e os
+# pesos vêm do mesmo arquivo no page cache do SO.
+if os.environ.get("PRELOAD_MODEL") == "1" and _find_onnx_model() is None:
+    _load_model_sync()
+
+
+def _predict_rows(X):
+    """
+    Aplica o modelo em uma matriz 2D. Retorna (preds, probs ou None).
+    
+    Com predict_proba, a classe sai do argmax das probabilidades: uma só
+    passada pelo modelo (o predict de RF/XGB já calcula as probabilidades).
+    """
+    if not hasattr(model, 'predict_proba'):
+        return model.predict(X), None
+    
+    probs = model.predict_proba(X)
+    idx = probs.argmax(axis=1)
+    classes = getattr(model, "classes_", None)
+    preds = np.asarray(classes)[idx] if classes is not None else idx
+    return preds, probs
+
+
+def _cache_get(key):
+    """Retorna (pred, proba) em cache para as features, ou None"""
+    if PREDICTION_CACHE_SIZE <= 0:
+        return None
+    with cache_lock:
+        result = prediction_cache.get(key)
+        if result is not None:
+            prediction_cache.move_to_end(key)
+        return result
+
+
+def _cache_put(key, pred, proba):
+    """Guarda (pred, proba) de uma linha do /predict no cache"""
+    if PREDICTION_CACHE_SIZE <= 0:
+        return
+    # Cópia da linha: uma view manteria viva a matriz inteira do micro-lote
+    result = (pred, np.array(proba) if proba is not None else None)
+    with cache_lock:
+        prediction_cache[key] = result
+        prediction_cache.move_to_end(key)
+        if len(prediction_cache) > PREDICTION_CACHE_SIZE:
+            prediction_cache.popitem(last=False)
+
+
+def _cache_get_many(keys):
+    """Retorna (pred, proba) em cache para cada chave, ou None (um só lock por lote)"""
+    with cache_lock:
+        hits = [prediction_cache.get(key) for key in keys]
+        for key, hit in zip(keys, hits):
+            if hit is not None:
+                prediction_cache.move_to_end(key)
+    return hits
+
+
+def _cache_put_many(keys, preds, probs):
+    """Guarda as linhas preditas no cache (um só lock por lote)"""
+    # Linhas de probs são views da matriz só das linhas novas (sem cópia por linha)
+    rows = probs if probs is not None else [None] * len(keys)
+    with cache_lock:
+        for key, pred, proba in zip(keys, preds, rows):
+            prediction_cache[key] = (pred, proba)
+            prediction_cache.move_to_end(key)
+        while len(prediction_cache) > PREDICTION_CACHE_SIZE:
+            prediction_cache.popitem(last=False)
+
+
+def _predict_rows_cached(instances):
+    """
+    Como _predict_rows, mas só as linhas fora do cache vão ao modelo;
+    o resultado é remontado na ordem original.
+    Sem cache (PREDICTION_CACHE_SIZE=0) ou em lotes grandes, vai direto ao modelo.
+    """
+    if PREDICTION_CACHE_SIZE <= 0 or len(instances) > PREDICTION_CACHE_MAX_BATCH:
+        return _predict_rows(np.asarray(instances, dtype=MODEL_DTYPE))
+    
+    keys = [tuple(row) for row in instances]
+    hits = _cache_get_many(keys)
+    missing = [i for i, hit in enumerate(hits) if hit is None]
+    
+    if len(missing) == len(keys):
+        # Nada em cache: resultado do modelo direto, sem remontar
+        preds, probs = _predict_rows(np.asarray(instances, dtype=MODEL_DTYPE))
+        _cache_put_many(keys, preds, probs)
+        return preds, probs
+    
+    if missing:
+        X = np.asarray([instances[i] for i in missing], dtype=MODEL_DTYPE)
+        preds, probs = _predict_rows(X)
+        _cache_put_many([keys[i] for i in missing], preds, probs)
+        for j, i in enumerate(missing):
+            hits[i] = (preds[j], probs[j] if probs is not None else None)
+    
+    preds = np.asarray([pred for pred, _ in hits])
+    probs = np.vstack([proba for _, proba in hits]) if hits[0][1] is not None else None
+    return preds, probs
+
+
+def _predict_items(items):
+    """
+    Prediz um lote de (features, future) em uma só chamada ao modelo.
+    Se o lote falhar (ex.: nº de features diferente), prediz item a item
+    para que só a requisição inválida receba o erro.
+    """
+    try:
+        if batch_buffer is not None:
+            # Preenche o buffer in-place (o worker processa um lote por vez)
+            X = batch_buffer[:len(items)]
+            for i, (features, _) in enumerate(items):
+                X[i, :] = features
+        else:
+            X = np.asarray([features for features, _ in items], dtype=MODEL_DTYPE)
+        preds, probs = _predict_rows(X)
+        return [
+            (preds[i], probs[i] if probs is not None else None)
+            for i in range(len(items))
+        ]
+    except Exception:
+        results = []
+        for features, _ in items:
+            try:
+                preds, probs = _predict_rows(np.asarray(features, dtype=MODEL_DTYPE).reshape(1, -1))
+                results.append((preds[0], probs[0] if probs is not None else None))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+async def _batch_worker():
+    """Consome a fila do /predict agrupando requisições em lotes"""
+    loop = asyncio.get_running_loop()
+    while True:
+        items = [await batch_queue.get()]
+        deadline = loop.time() + MAX_WAIT_MS / 1000
+        while len(items) < MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(batch_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        # Inferência em thread para não bloquear o event loop
+        results = await asyncio.to_thread(_predict_items, items)
+        for (_, future), result in zip(items, results):
+            if future.done():  # cliente desconectou
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global batch_queue
+    # Modelo carregado antes do worker aceitar requisições
+    await load_model()
+    batch_queue = asyncio.Queue()
+    worker = asyncio.create_task(_batch_worker())
+    yield
+    worker.cancel()
+
+
+app = FastAPI(
+    title="API de Predição de Inadimplência",
+    description="Modelo de ML para prever inadimplência de clientes",
+    version="1.0.0",
+    lifespan=lifespan,
+    # Respostas serializadas com orjson (C) em vez do json da stdlib
+    default_response_class=ORJSONResponse
+)
+
+
 class ClienteInput(BaseModel):
     """Schema de entrada - features do cliente"""
     features: List[float]  # Lista de features numéricas
@@ -80,14 +340,17 @@ async def root():
 
 
 @app.get("/health")
-async def health():
+def health():
     """Health check para Cloud Run/Kubernetes"""
     if model is None:
         raise HTTPException(status_code=503, detail="Modelo não carregado")
     return {"status": "healthy"}
 
 
-@app.post("/predict", response_model=PredictionOutput)
+# Sem response_model nas rotas de predição: os schemas de saída ficam só na
+# documentação (OpenAPI) e a resposta é montada como dict, sem revalidação
+# /predict entra na fila do micro-batching; a inferência roda em thread
+@app.post("/predict", responses={200: {"model": PredictionOutput}})
 async def predict(cliente: ClienteInput):
     """
     Faz predição para um único cliente.
@@ -98,30 +361,33 @@ async def predict(cliente: ClienteInput):
         raise HTTPException(status_code=503, detail="Modelo não carregado")
     
     try:
-        # Converter para array 2D
-        X = np.array(cliente.features).reshape(1, -1)
-        
-        # Predição
-        pred = model.predict(X)[0]
+        key = tuple(cliente.features)
+        result = _cache_get(key)
+        if result is None:
+            # Enfileira e aguarda o resultado do lote
+            future = asyncio.get_running_loop().create_future()
+            await batch_queue.put((cliente.features, future))
+            result = await future
+            _cache_put(key, *result)
+        pred, proba = result
         
         # Probabilidade (se disponível)
-        prob = None
-        if hasattr(model, 'predict_proba'):
-            proba = model.predict_proba(X)[0]
-            prob = float(max(proba))
+        prob = float(max(proba)) if proba is not None else None
         
-        return PredictionOutput(
-            prediction="inadimplente" if pred == 1 else "adimplente",
-            class_id=int(pred),
-            probability=prob
-        )
+        return ORJSONResponse(content={
+            "prediction": "inadimplente" if pred == 1 else "adimplente",
+            "class_id": int(pred),
+            "probability": prob
+        })
     
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro na predição: {str(e)}")
 
 
-@app.post("/predict/batch", response_model=BatchPredictionOutput)
-async def predict_batch(batch: ClienteBatchInput):
+# Handler "def" (não async): o FastAPI o executa no threadpool,
+# então o predict do sklearn não bloqueia o event loop
+@app.post("/predict/batch", responses={200: {"model": BatchPredictionOutput}})
+def predict_batch(batch: ClienteBatchInput):
     """
     Faz predição para múltiplos clientes de uma vez.
     
@@ -131,27 +397,24 @@ async def predict_batch(batch: ClienteBatchInput):
         raise HTTPException(status_code=503, detail="Modelo não carregado")
     
     try:
-        # Converter para array 2D
-        X = np.array(batch.instances)
+        # Predições e probabilidades (se disponível); só as linhas fora do
+        # cache viram um array 2D no MODEL_DTYPE e passam pelo modelo
+        preds, probs = _predict_rows_cached(batch.instances)
         
-        # Predições
-        preds = model.predict(X)
+        # Rótulos, classes e confianças calculados de forma vetorizada
+        labels = np.where(preds == 1, "inadimplente", "adimplente").tolist()
+        class_ids = np.asarray(preds).astype(int, copy=False).tolist()
+        if probs is not None:
+            confidences = probs.max(axis=1).astype(float, copy=False).tolist()
+        else:
+            confidences = [None] * len(class_ids)
         
-        # Probabilidades (se disponível)
-        probs = None
-        if hasattr(model, 'predict_proba'):
-            probs = model.predict_proba(X)
-        
-        results = []
-        for i, pred in enumerate(preds):
-            prob = float(max(probs[i])) if probs is not None else None
-            results.append(PredictionOutput(
-                prediction="inadimplente" if pred == 1 else "adimplente",
-                class_id=int(pred),
-                probability=prob
-            ))
+        results = [
+            {"prediction": label, "class_id": class_id, "probability": prob}
+            for label, class_id, prob in zip(labels, class_ids, confidences)
+        ]
         
-        return BatchPredictionOutput(predictions=results)
+        return ORJSONResponse(content={"predictions": results})
     
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro na predição: {str(e)}")
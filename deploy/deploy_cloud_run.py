@@ -6,48 +6,65 @@ Mais flexível que Vertex AI Endpoint - você controla as versões das libs.
 
 import os
 import subprocess
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 
 # Configurações
 PROJECT_ID = "mlops-484912"
 REGION = "us-central1"
 SERVICE_NAME = "api-inadimplencia"
 IMAGE_NAME = f"gcr.io/{PROJECT_ID}/{SERVICE_NAME}"
+# Builder buildx com driver docker-container (o driver padrão "docker" não exporta cache)
+BUILDX_BUILDER = "mlops-builder"
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
+# Diretório copiado para a imagem (COPY model/ no Dockerfile)
+MODEL_DIR = os.path.join(SCRIPT_DIR, "model")
 
 
 def find_model():
     """Encontra o modelo treinado"""
     import mlflow
+    from mlflow.tracking import MlflowClient
     
     mlruns_path = os.path.join(PROJECT_DIR, "mlruns")
     mlflow.set_tracking_uri(mlruns_path)
+    client = MlflowClient()
     
     # Buscar em todos os experiments
     experiments = mlflow.search_experiments()
     
-    for exp in experiments:
-        runs = mlflow.search_runs(experiment_ids=[exp.experiment_id])
-        if not runs.empty:
-            best_run = runs.sort_values("metrics.accuracy", ascending=False).iloc[0]
-            run_id = best_run["run_id"]
-            
-            # Tentar carregar modelo
-            for artifact_name in ["model_rfc", "model_xgb", "model"]:
+    def best_run(exp):
+        # Só o melhor run (ordenado pelo MLflow), sem montar DataFrame
+        runs = client.search_runs(
+            experiment_ids=[exp.experiment_id],
+            order_by=["metrics.accuracy DESC"],
+            max_results=1
+        )
+        return runs[0] if runs else None
+    
+    # Uma busca por experiment, em paralelo; candidatos do melhor para o pior
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        best_runs = [run for run in pool.map(best_run, experiments) if run is not None]
+    best_runs.sort(key=lambda run: run.data.metrics.get("accuracy", float("-inf")), reverse=True)
+    
+    for run in best_runs:
+        run_id = run.info.run_id
+        
+        # Tentar carregar modelo
+        for artifact_name in ["model_rfc", "model_xgb", "model"]:
+            try:
+                model_uri = f"runs:/{run_id}/{artifact_name}"
+                model = mlflow.sklearn.load_model(model_uri)
+                print(f"✅ Modelo carregado: {artifact_name}")
+                return model
+            except:
                 try:
-                    model_uri = f"runs:/{run_id}/{artifact_name}"
-                    model = mlflow.sklearn.load_model(model_uri)
-                    print(f"✅ Modelo carregado: {artifact_name}")
+                    model = mlflow.xgboost.load_model(model_uri)
+                    print(f"✅ Modelo XGBoost carregado: {artifact_name}")
                     return model
                 except:
-                    try:
-                        model = mlflow.xgboost.load_model(model_uri)
-                        print(f"✅ Modelo XGBoost carregado: {artifact_name}")
-                        return model
-                    except:
-                        continue
+                    continue
     
     raise Exception("Modelo não encontrado!")
 
@@ -55,38 +72,148 @@ def find_model():
 def save_model_locally(model):
     """Salva modelo como pkl"""
     import joblib
-    model_path = os.path.join(SCRIPT_DIR, "model.pkl")
-    joblib.dump(model, model_path)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    model_path = os.path.join(MODEL_DIR, "model.pkl")
+    # Sem compressão: a API abre os arrays do modelo via mmap (mmap_mode='r'),
+    # o que não funciona com arquivos comprimidos; a camada da imagem já é gzip
+    joblib.dump(model, model_path, protocol=5)
     print(f"✅ Modelo salvo em: {model_path}")
+    
+    # Versão ONNX: a API usa ONNX Runtime quando o arquivo existe.
+    # Remove os ONNX do deploy anterior antes (e após falha): senão a imagem
+    # serviria o modelo antigo em ONNX com o model.pkl novo ao lado
+    _remove_onnx_files()
+    try:
+        export_model_to_onnx(model)
+    except Exception as e:
+        _remove_onnx_files()
+        print(f"⚠️ Exportação ONNX falhou ({e}). A API usará o model.pkl")
+    
     return model_path
 
 
-def build_and_push_image():
-    """Builda e envia imagem para Container Registry"""
-    print("\n📦 Buildando imagem Docker...")
+def _remove_onnx_files():
+    """Apaga model.onnx e model.int8.onnx de MODEL_DIR, se existirem"""
+    for name in ("model.onnx", "model.int8.onnx"):
+        path = os.path.join(MODEL_DIR, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def export_model_to_onnx(model):
+    """Converte o modelo (sklearn ou XGBoost) para ONNX"""
+    import json
+    n_features = model.n_features_in_
+    
+    if type(model).__module__.startswith("xgboost"):
+        from onnxmltools import convert_xgboost
+        from onnxmltools.convert.common.data_types import FloatTensorType
+        onx = convert_xgboost(model, initial_types=[("input", FloatTensorType([None, n_features]))])
+    else:
+        from skl2onnx import convert_sklearn
+        from skl2onnx.common.data_types import FloatTensorType
+        onx = convert_sklearn(
+            model,
+            initial_types=[("input", FloatTensorType([None, n_features]))],
+            options={id(model): {"zipmap": False}}  # probabilidades como tensor
+        )
+    
+    # Classes nos metadados para a API mapear argmax -> rótulo
+    meta = onx.metadata_props.add()
+    meta.key = "classes"
+    meta.value = json.dumps(model.classes_.tolist())
+    
+    onnx_path = os.path.join(MODEL_DIR, "model.onnx")
+    with open(onnx_path, "wb") as f:
+        f.write(onx.SerializeToString())
+    print(f"✅ Modelo ONNX salvo em: {onnx_path}")
+    
+    quantize_onnx_model(onnx_path, onx)
+    return onnx_path
+
+
+# Operadores com pesos que a quantização dinâmica converte para int8
+QUANTIZABLE_OPS = {"MatMul", "Gemm", "Conv", "Attention", "LSTM", "GRU"}
+
+
+def quantize_onnx_model(onnx_path, onx):
+    """
+    Gera model.int8.onnx (pesos int8, usa instruções VNNI na CPU do Cloud Run).
+    
+    Ensembles de árvores (RF/XGBoost) não têm pesos quantizáveis: nesse
+    caso nada é gerado e a API segue com o model.onnx.
+    """
+    int8_path = os.path.join(MODEL_DIR, "model.int8.onnx")
+    if os.path.exists(int8_path):
+        os.remove(int8_path)
+    
+    if not any(node.op_type in QUANTIZABLE_OPS for node in onx.graph.node):
+        print("ℹ️ Modelo sem camadas quantizáveis: mantendo ONNX float32")
+        return None
+    
+    import onnx
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+    
+    # Preserva os metadados (classes) no modelo quantizado
+    quantized = onnx.load(int8_path)
+    for prop in onx.metadata_props:
+        meta = quantized.metadata_props.add()
+        meta.key, meta.value = prop.key, prop.value
+    onnx.save(quantized, int8_path)
     
-    # Copiar requirements para deploy
-    shutil.copy(
-        os.path.join(PROJECT_DIR, "requirements.txt"),
-        os.path.join(SCRIPT_DIR, "requirements.txt")
+    print(f"✅ Modelo ONNX int8 salvo em: {int8_path}")
+    return int8_path
+
+
+def _ensure_buildx_builder():
+    """Cria (uma vez) o builder docker-container; retorna o nome ou None se falhar"""
+    inspect = subprocess.run(
+        f"docker buildx inspect {BUILDX_BUILDER}", shell=True, capture_output=True, text=True
     )
+    if inspect.returncode == 0:
+        return BUILDX_BUILDER
     
-    # Build
-    cmd_build = f"docker build -t {IMAGE_NAME} -f {SCRIPT_DIR}/Dockerfile {PROJECT_DIR}"
-    print(f"   $ {cmd_build}")
-    result = subprocess.run(cmd_build, shell=True, capture_output=True, text=True)
+    create = subprocess.run(
+        f"docker buildx create --name {BUILDX_BUILDER} --driver docker-container",
+        shell=True, capture_output=True, text=True
+    )
+    if create.returncode != 0:
+        print(f"⚠️ Não foi possível criar o builder buildx: {create.stderr.strip()}")
+        return None
+    return BUILDX_BUILDER
+
+
+def build_and_push_image():
+    """Builda (buildx, com cache no registry) e envia imagem para Container Registry"""
+    print("\n📦 Buildando e enviando imagem Docker...")
     
-    if result.returncode != 0:
-        print(f"❌ Erro no build: {result.stderr}")
-        return False
+    # Build + push em um passo (contexto = deploy/: api_model.py, requirements-api.txt e model/)
+    # As camadas ficam em {IMAGE_NAME}:buildcache e são reaproveitadas no próximo deploy
+    cache_ref = f"{IMAGE_NAME}:buildcache"
+    build_base = f"docker buildx build --push -t {IMAGE_NAME} -f {SCRIPT_DIR}/Dockerfile {SCRIPT_DIR}"
     
-    # Push
-    print("\n📤 Enviando imagem para Container Registry...")
-    cmd_push = f"docker push {IMAGE_NAME}"
-    result = subprocess.run(cmd_push, shell=True, capture_output=True, text=True)
+    builder = _ensure_buildx_builder()
+    result = None
+    if builder:
+        cmd_build = (
+            f"docker buildx build --builder {builder} --push "
+            f"--cache-to=type=registry,ref={cache_ref},mode=max "
+            f"--cache-from=type=registry,ref={cache_ref} "
+            f"-t {IMAGE_NAME} -f {SCRIPT_DIR}/Dockerfile {SCRIPT_DIR}"
+        )
+        print(f"   $ {cmd_build}")
+        result = subprocess.run(cmd_build, shell=True, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"⚠️ Build com cache no registry falhou: {result.stderr.strip()}")
+    
+    if result is None or result.returncode != 0:
+        # Sem cache exportável (driver "docker" padrão): build simples
+        print(f"   $ {build_base}")
+        result = subprocess.run(build_base, shell=True, capture_output=True, text=True)
     
     if result.returncode != 0:
-        print(f"❌ Erro no push: {result.stderr}")
+        print(f"❌ Erro no build: {result.stderr}")
         return False
     
     print(f"✅ Imagem enviada: {IMAGE_NAME}")
@@ -105,8 +232,11 @@ def deploy_to_cloud_run():
         --allow-unauthenticated \
         --memory 1Gi \
         --cpu 1 \
-        --min-instances 0 \
+        --min-instances 1 \
         --max-instances 3 \
+        --concurrency 20 \
+        --cpu-boost \
+        --execution-environment gen2 \
         --port 8080
     """
     
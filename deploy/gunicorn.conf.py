@@ -0,0 +1,15 @@
+"""
+Configuração do gunicorn para a API (lida automaticamente do diretório de trabalho).
+A imagem distroless não tem shell, então os workers são definidos aqui.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+# Um worker uvicorn por vCPU (uvloop é usado automaticamente se instalado)
+workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Modelo carregado no master e compartilhado com os workers (PRELOAD_MODEL=1)
+preload_app = True
@@ -9,6 +9,7 @@ import os
 import sys
 import joblib
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 # Adicionar path
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -19,6 +20,7 @@ sys.path.append(PROJECT_DIR)
 def find_and_load_model():
     """Encontra e carrega o modelo treinado"""
     import mlflow
+    from mlflow.tracking import MlflowClient
     
     mlruns_path = os.path.join(PROJECT_DIR, "mlruns")
     
@@ -28,26 +30,29 @@ def find_and_load_model():
     
     print(f"📂 Buscando modelo em: {mlruns_path}")
     mlflow.set_tracking_uri(mlruns_path)
+    client = MlflowClient()
     
     # Buscar em todos os experiments
     experiments = mlflow.search_experiments()
     print(f"   Encontrados {len(experiments)} experiments")
     
-    for exp in experiments:
-        if exp.name in ['.trash', 'models']:
-            continue
-            
-        runs = mlflow.search_runs(experiment_ids=[exp.experiment_id])
-        
-        if runs.empty:
-            continue
-            
-        # Ordenar por accuracy
-        if 'metrics.accuracy' in runs.columns:
-            runs = runs.sort_values("metrics.accuracy", ascending=False)
-        
-        best_run = runs.iloc[0]
-        run_id = best_run["run_id"]
+    def best_run(exp):
+        # Melhor run por accuracy, ordenado pelo MLflow (sem DataFrame)
+        runs = client.search_runs(
+            experiment_ids=[exp.experiment_id],
+            order_by=["metrics.accuracy DESC"],
+            max_results=1
+        )
+        return (exp, runs[0]) if runs else None
+    
+    # Uma busca por experiment, em paralelo; candidatos do melhor para o pior
+    experiments = [exp for exp in experiments if exp.name not in ['.trash', 'models']]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        candidates = [c for c in pool.map(best_run, experiments) if c is not None]
+    candidates.sort(key=lambda c: c[1].data.metrics.get("accuracy", float("-inf")), reverse=True)
+    
+    for exp, run in candidates:
+        run_id = run.info.run_id
         print(f"   Tentando run: {run_id} do experiment '{exp.name}'")
         
         # Tentar carregar modelo
@@ -79,7 +84,8 @@ def test_prediction(model):
     
     if os.path.exists(df_path):
         import pandas as pd
-        df = pd.read_csv(df_path)
+        # Só as 5 primeiras linhas são lidas (o parser para aí)
+        df = pd.read_csv(df_path, nrows=5, index_col=0)  # 1ª coluna = índice salvo
         
         # Colunas que NÃO são features (remover antes de prever)
         cols_to_drop = ["Inadimplente", "ID_Cliente", "Status_Pagamento"]
@@ -88,12 +94,12 @@ def test_prediction(model):
         # Separar target se existir
         target = "Inadimplente"
         if target in df.columns:
-            y_real = df[target].head(5).values
+            y_real = df[target].values
         else:
             y_real = None
         
         # Features para predição (remover colunas não-features)
-        X_test = df.drop(columns=cols_to_drop, errors='ignore').head(5)
+        X_test = df.drop(columns=cols_to_drop, errors='ignore')
         
         print(f"   Features usadas ({len(X_test.columns)}): {list(X_test.columns)[:5]}...")
         
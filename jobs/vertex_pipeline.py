@@ -40,7 +40,7 @@ PIPELINE_ROOT = f"gs://{BUCKET_NAME}/pipeline_root"
 
 @component(
     base_image="python:3.10-slim",
-    packages_to_install=["pandas", "numpy", "scikit-learn", "google-cloud-storage"]
+    packages_to_install=["pandas", "numpy", "pyarrow", "scikit-learn", "google-cloud-storage"]
 )
 def preprocessamento(
     input_gcs_path: str,
@@ -55,17 +55,32 @@ def preprocessamento(
     """
     import pandas as pd
     import numpy as np
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    from pyarrow import fs as pafs
     from datetime import datetime
     
-    # Carrega dados
-    df = pd.read_csv(input_gcs_path)
+    # Datas que seguem no dataset: mantidas como texto (como no CSV original),
+    # senão o Arrow infere date32 e o fillna abaixo mistura datas e strings
+    date_cols = ["Data_Contratacao", "Data_Vencimento_Fatura", "Data_Ingestao", "Data_Atualizacao"]
+    
+    # Carrega dados (parser multi-thread do pyarrow, lendo em blocos de 64 MiB)
+    filesystem, path = pafs.FileSystem.from_uri(input_gcs_path)
+    with filesystem.open_input_stream(path) as stream:
+        table = pacsv.read_csv(
+            stream,
+            read_options=pacsv.ReadOptions(use_threads=True, block_size=64 << 20),
+            convert_options=pacsv.ConvertOptions(column_types={c: pa.string() for c in date_cols}),
+        )
+    # Colunas de texto pelo schema do Arrow (não depende do dtype de string do pandas)
+    str_cols = [f.name for f in table.schema if pa.types.is_string(f.type) or pa.types.is_large_string(f.type)]
+    df = table.to_pandas()
     print(f"Dados carregados: {df.shape}")
     
-    # Trata valores nulos
-    for col in df.select_dtypes(include=[np.number]).columns:
-        df[col] = df[col].fillna(df[col].median())
-    for col in df.select_dtypes(include=[object]).columns:
-        df[col] = df[col].fillna('desconhecido')
+    # Trata valores nulos (uma operação por tipo, não por coluna)
+    num_cols = df.select_dtypes(include=[np.number]).columns
+    df[num_cols] = df[num_cols].fillna(df[num_cols].median(numeric_only=True))
+    df[str_cols] = df[str_cols].fillna('desconhecido')
     
     # Calcula idade
     if "Data_Nascimento" in df.columns:
@@ -77,14 +92,15 @@ def preprocessamento(
     drop_cols = ["Telefone", "Nome", "Email", "Data_Nascimento"]
     df = df.drop(columns=[c for c in drop_cols if c in df.columns], errors='ignore')
     
-    # Salva output
-    df.to_csv(output_dataset.path, index=False)
+    # Salva output (Parquet: tipado e comprimido, sem re-parse nas próximas etapas)
+    df.to_parquet(output_dataset.path, engine='pyarrow', compression='zstd', index=False)
+    output_dataset.metadata["format"] = "parquet"
     print(f"Dados processados salvos: {output_dataset.path}")
 
 
 @component(
     base_image="python:3.10-slim",
-    packages_to_install=["pandas", "scikit-learn", "xgboost", "mlflow", "google-cloud-storage"]
+    packages_to_install=["pandas", "pyarrow", "scikit-learn", "xgboost", "mlflow", "google-cloud-storage"]
 )
 def treinamento(
     input_dataset: Input[Dataset],
@@ -108,7 +124,7 @@ def treinamento(
     import mlflow
     
     # Carrega dados
-    df = pd.read_csv(input_dataset.path)
+    df = pd.read_parquet(input_dataset.path)
     
     # Prepara features e target
     target = "Status_Pagamento"
@@ -156,7 +172,7 @@ def treinamento(
 
 @component(
     base_image="python:3.10-slim",
-    packages_to_install=["pandas", "google-cloud-storage"]
+    packages_to_install=["pandas", "pyarrow", "google-cloud-storage"]
 )
 def scoring(
     input_dataset: Input[Dataset],
@@ -178,7 +194,7 @@ def scoring(
         model = pickle.load(f)
     
     # Carrega dados
-    df = pd.read_csv(input_dataset.path)
+    df = pd.read_parquet(input_dataset.path)
     
     # Remove target se existir
     target = "Status_Pagamento"
@@ -197,7 +213,8 @@ def scoring(
     df_out["probability"] = probabilities
     
     # Salva
-    df_out.to_csv(output_predictions.path, index=False)
+    df_out.to_parquet(output_predictions.path, engine='pyarrow', compression='zstd', index=False)
+    output_predictions.metadata["format"] = "parquet"
     print(f"Predições salvas: {output_predictions.path}")
 
 
@@ -25,13 +25,37 @@ Opção 4 - Via Python (este script):
     3. Execute este script
 """
 
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
+import requests
 import os
 
 # Configurações
 PROJECT_ID = "mlops-484912"
 BUCKET_NAME = "meu-bucket-29061999"
 LOCAL_DATA_DIR = "data"
+UPLOAD_MAX_WORKERS = 16
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # arquivos grandes sobem em chunks de 8 MiB
+HTTP_POOL_SIZE = 32  # >= UPLOAD_MAX_WORKERS: cada thread reaproveita sua conexão TLS
+
+
+def get_storage_client():
+    """
+    Cliente do GCS sobre uma única sessão HTTP com pool de conexões,
+    para que os uploads reutilizem o handshake TCP+TLS.
+    """
+    credentials, _ = google.auth.default(
+        scopes=["https://www.googleapis.com/auth/devstorage.read_write"]
+    )
+    session = AuthorizedSession(credentials)
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE
+    )
+    session.mount("https://", adapter)
+    return storage.Client(project=PROJECT_ID, credentials=credentials, _http=session)
+
 
 def upload_files():
     """Faz upload de todos os CSVs para o GCS."""
@@ -42,19 +66,28 @@ def upload_files():
     # ou: gcloud auth application-default login
     
     try:
-        client = storage.Client(project=PROJECT_ID)
+        client = get_storage_client()
         bucket = client.bucket(BUCKET_NAME)
         
         # Lista arquivos locais
-        for filename in os.listdir(LOCAL_DATA_DIR):
-            if filename.endswith('.csv'):
-                local_path = os.path.join(LOCAL_DATA_DIR, filename)
-                gcs_path = f"data/{filename}"
-                
-                blob = bucket.blob(gcs_path)
-                blob.upload_from_filename(local_path)
-                
-                print(f"✅ Upload: {filename} → gs://{BUCKET_NAME}/{gcs_path}")
+        filenames = [f for f in os.listdir(LOCAL_DATA_DIR) if f.endswith('.csv')]
+        
+        # Upload em paralelo (threads liberam o GIL durante o I/O HTTP)
+        results = transfer_manager.upload_many_from_filenames(
+            bucket,
+            filenames,
+            source_directory=LOCAL_DATA_DIR,
+            blob_name_prefix="data/",
+            blob_constructor_kwargs={"chunk_size": UPLOAD_CHUNK_SIZE},
+            max_workers=UPLOAD_MAX_WORKERS,
+            worker_type=transfer_manager.THREAD,
+        )
+        
+        for filename, result in zip(filenames, results):
+            if isinstance(result, Exception):
+                print(f"❌ Falha: {filename} → {result}")
+            else:
+                print(f"✅ Upload: {filename} → gs://{BUCKET_NAME}/data/{filename}")
         
         print("\n🎉 Upload concluído!")
         
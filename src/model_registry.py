@@ -1,15 +1,15 @@
+import numpy as np
 import pandas as pd
-import xgboost as xgb
 import mlflow
-import mlflow.xgboost
 import os
 import logging
-from xgboost import XGBClassifier
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import StratifiedShuffleSplit
 from sklearn.metrics import accuracy_score, precision_score, balanced_accuracy_score, recall_score, f1_score
-from google.cloud import storage
-from google.cloud import aiplatform
+# xgboost, mlflow.xgboost e google.cloud (storage/aiplatform) são importados
+# só nas funções que os usam, para não pesar no carregamento do módulo
 
 # ==================== CONFIGURAÇÕES GCP ====================
 PROJECT_ID = "mlops-484912"
@@ -24,28 +24,58 @@ PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 # Em produção, você usaria um servidor MLflow ou Vertex AI
 MLFLOW_TRACKING_URI = os.path.join(PROJECT_DIR, "mlruns")
 
+# Uploads/downloads grandes no GCS em partes paralelas de 32 MiB
+# (inclui os artifacts que o MLflow envia para gs://)
+GCS_CHUNK_SIZE = 32 * 1024 * 1024
+os.environ.setdefault("MLFLOW_GCS_UPLOAD_CHUNK_SIZE", str(GCS_CHUNK_SIZE))
+
+# Scaler/colunas ajustados no pré-processamento (gerado por pre_processamento.py)
+PREPROCESSOR_PATH = os.path.join(PROJECT_DIR, "preprocessor.pkl")
+
 # Configura logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def carregar_dados():
     logging.info("Carregando os dados pré-processados")
     csv_path = os.path.join(PROJECT_DIR, "df_transformado.csv")
-    df_transformado = pd.read_csv(csv_path)
+    # index_col=0: o pre_processamento salva o índice (index=True); sem isso ele
+    # viraria a feature "Unnamed: 0" e o modelo não bateria com o feature_cols salvo
+    df_transformado = pd.read_csv(csv_path, index_col=0)
+    # float64/int64 -> float32/int32: os modelos de árvore trabalham em float32,
+    # então o treino move metade dos bytes (e não converte internamente)
+    df_transformado = df_transformado.astype(
+        {c: "float32" for c in df_transformado.select_dtypes("float64").columns}
+        | {c: "int32" for c in df_transformado.select_dtypes("int64").columns}
+    )
     return df_transformado
 
 def split_dados(df: pd.DataFrame, target: str, test_size=0.2, random_state=42):
     logging.info("Dividindo em amostras de treino 80% e teste 20%")
     X = df.drop(columns=[target])
     y = df[target]
-    return train_test_split(X, y, test_size=test_size, random_state=random_state, stratify=y)
+    # Só os índices são embaralhados (mesma divisão do train_test_split com
+    # stratify=y); o DataFrame é fatiado uma única vez
+    sss = StratifiedShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+    train_idx, test_idx = next(sss.split(np.zeros(len(y)), y))
+    return X.iloc[train_idx], X.iloc[test_idx], y.iloc[train_idx], y.iloc[test_idx]
 
-def treinar_modelo_xgb(X_train, y_train, X_test, y_test, params=None):
+def treinar_modelo_xgb(X_train, y_train, X_test, y_test, params=None, n_jobs=None):
     logging.info("Treinando modelo XGBoost")
     if params is None:
         params = {
             "objective": "binary:logistic",
-            "use_label_encoder": False
+            "use_label_encoder": False,
+            # Splits por histograma (256 bins) em vez do método exato;
+            # com "hist" o XGBClassifier monta um QuantileDMatrix no fit
+            "tree_method": "hist",
+            "max_bin": 256,
+            "device": "cpu",
+            "n_jobs": -1,
         }
+    if n_jobs is not None:
+        params = {**params, "n_jobs": n_jobs}
+    import xgboost as xgb
+
     model = xgb.XGBClassifier(**params, enable_categorical=True)
     model.fit(X_train, y_train) #treinamento
     y_pred = model.predict(X_test) #teste
@@ -64,7 +94,7 @@ def treinar_modelo_xgb(X_train, y_train, X_test, y_test, params=None):
 
     return model, metrics
 
-def treinar_modelo_rf(X_train, y_train, X_test, y_test, params=None):
+def treinar_modelo_rf(X_train, y_train, X_test, y_test, params=None, n_jobs=None):
     logging.info("Treinando modelo RandomForestClassifier")
     if params is None:
         params = {
@@ -76,6 +106,8 @@ def treinar_modelo_rf(X_train, y_train, X_test, y_test, params=None):
             "n_jobs": -1,
             "random_state": 42,
         }
+    if n_jobs is not None:
+        params = {**params, "n_jobs": n_jobs}
     model = RandomForestClassifier(**params)
     model.fit(X_train, y_train) #treinamento
     y_pred = model.predict(X_test)  # predição
@@ -95,6 +127,39 @@ def treinar_modelo_rf(X_train, y_train, X_test, y_test, params=None):
     return model, metrics
 
 
+def _log_preprocessor():
+    """Loga o pré-processador junto do modelo, para o scoring reutilizá-lo."""
+    if os.path.exists(PREPROCESSOR_PATH):
+        mlflow.log_artifact(PREPROCESSOR_PATH, artifact_path="preprocessor")
+    else:
+        logging.warning(f"Pré-processador não encontrado em {PREPROCESSOR_PATH}; rode pre_processamento.py")
+
+
+def compilar_rf_treelite(model, libpath: str) -> str | None:
+    """
+    Compila o RandomForest em uma biblioteca C (Treelite + TL2cgen) para
+    inferência sem percorrer as árvores em Python. None se indisponível.
+    """
+    try:
+        import treelite
+        import tl2cgen
+    except ImportError:
+        logging.warning("treelite/tl2cgen não instalados: RF não será compilado")
+        return None
+
+    try:
+        tl_model = treelite.sklearn.import_model(model)
+        tl2cgen.export_lib(
+            tl_model, toolchain="gcc", libpath=libpath,
+            params={"parallel_comp": 32, "quantize": 1}
+        )
+    except Exception as e:
+        logging.warning(f"Falha ao compilar RF com Treelite: {e}")
+        return None
+    logging.info(f"RF compilado em {libpath}")
+    return libpath
+
+
 def registra_mlflow_gcp(model, metrics, experiment_name="inadimplencia-rfc", tags=None, model_type="sklearn"):
     """
     Registra modelo no MLflow usando Google Cloud Storage como backend.
@@ -112,14 +177,15 @@ def registra_mlflow_gcp(model, metrics, experiment_name="inadimplencia-rfc", tag
     mlflow.set_experiment(experiment_name)
     
     with mlflow.start_run():
-        # Log de parâmetros do modelo
-        mlflow.log_param("model_type", "RandomForestClassifier" if model_type == "sklearn" else "XGBoostClassifier")
-        mlflow.log_param("project_id", PROJECT_ID)
-        mlflow.log_param("bucket", BUCKET_NAME)
+        # Log de parâmetros do modelo (uma única escrita no tracking store)
+        mlflow.log_params({
+            "model_type": "RandomForestClassifier" if model_type == "sklearn" else "XGBoostClassifier",
+            "project_id": PROJECT_ID,
+            "bucket": BUCKET_NAME,
+        })
         
         # Log de métricas - IMPORTANTE para comparar modelos
-        for k, v in metrics.items():
-            mlflow.log_metric(k, v)
+        mlflow.log_metrics(metrics)
 
         # Tags para organização e filtro
         if tags:
@@ -128,8 +194,16 @@ def registra_mlflow_gcp(model, metrics, experiment_name="inadimplencia-rfc", tag
         # Log do modelo serializado
         if model_type == "sklearn":
             mlflow.sklearn.log_model(model, "model_rfc", registered_model_name="ModelRFC-GCP")
+            # Versão compilada (.so) para o scoring em CPU (mesma arquitetura do treino)
+            with tempfile.TemporaryDirectory() as tmp:
+                libpath = compilar_rf_treelite(model, os.path.join(tmp, "rf_predict.so"))
+                if libpath:
+                    mlflow.log_artifact(libpath, artifact_path="compiled")
         else:
-            mlflow.xgboost.log_model(model, "model_xgb", registered_model_name="ModelXGB-GCP")
+            from mlflow import xgboost as mlflow_xgboost
+
+            mlflow_xgboost.log_model(model, "model_xgb", registered_model_name="ModelXGB-GCP")
+        _log_preprocessor()
         
         logging.info(f"Modelo registrado com sucesso no experimento: {experiment_name}")
 
@@ -142,16 +216,16 @@ def registra_mlflow_gcp_xgb(model, metrics, experiment_name="inadimplencia-xgb",
     mlflow.set_experiment(experiment_name)
     
     with mlflow.start_run():
-        mlflow.log_param("model_type", "XGBoostClassifier")
-        mlflow.log_param("project_id", PROJECT_ID)
-        
-        for k, v in metrics.items():
-            mlflow.log_metric(k, v)
+        mlflow.log_params({"model_type": "XGBoostClassifier", "project_id": PROJECT_ID})
+        mlflow.log_metrics(metrics)
 
         if tags:
             mlflow.set_tags(tags)
 
-        mlflow.xgboost.log_model(model, "model_xgb", registered_model_name="ModelXGB-GCP")
+        from mlflow import xgboost as mlflow_xgboost
+
+        mlflow_xgboost.log_model(model, "model_xgb", registered_model_name="ModelXGB-GCP")
+        _log_preprocessor()
 
 
 def upload_to_gcs(local_path: str, gcs_path: str):
@@ -159,24 +233,45 @@ def upload_to_gcs(local_path: str, gcs_path: str):
     Faz upload de arquivo local para o Google Cloud Storage.
     Útil para salvar datasets processados, modelos, ou outputs.
     """
+    from google.cloud import storage
+    from google.cloud.storage import transfer_manager
+
     client = storage.Client(project=PROJECT_ID)
     bucket = client.bucket(BUCKET_NAME)
     blob = bucket.blob(gcs_path)
-    blob.upload_from_filename(local_path)
+    if os.path.getsize(local_path) > GCS_CHUNK_SIZE:
+        # Arquivos grandes: partes enviadas em paralelo e compostas no GCS
+        transfer_manager.upload_chunks_concurrently(
+            local_path, blob, chunk_size=GCS_CHUNK_SIZE, max_workers=8
+        )
+    else:
+        blob.upload_from_filename(local_path)
     logging.info(f"Upload concluído: gs://{BUCKET_NAME}/{gcs_path}")
 
 
 def download_from_gcs(gcs_path: str, local_path: str):
     """Download de arquivo do GCS para local."""
+    from google.cloud import storage
+    from google.cloud.storage import transfer_manager
+
     client = storage.Client(project=PROJECT_ID)
     bucket = client.bucket(BUCKET_NAME)
-    blob = bucket.blob(gcs_path)
-    blob.download_to_filename(local_path)
+    # get_blob traz o tamanho (None se não existir: download_to_filename levanta NotFound)
+    blob = bucket.get_blob(gcs_path) or bucket.blob(gcs_path)
+    if blob.size and blob.size > GCS_CHUNK_SIZE:
+        # Arquivos grandes: faixas de bytes baixadas em paralelo
+        transfer_manager.download_chunks_concurrently(
+            blob, local_path, chunk_size=GCS_CHUNK_SIZE, max_workers=8
+        )
+    else:
+        blob.download_to_filename(local_path)
     logging.info(f"Download concluído: {local_path}")
 
 if __name__ == "__main__":
     # ==================== INICIALIZAÇÃO GCP ====================
     # Inicializa Vertex AI (equivalente ao MLClient do Azure)
+    from google.cloud import aiplatform
+
     aiplatform.init(
         project=PROJECT_ID,
         location=REGION,
@@ -198,9 +293,14 @@ if __name__ == "__main__":
     # Mostra features que serão usadas
     logging.info(f"Features do modelo ({len(X_train.columns)}): {list(X_train.columns)}")
     
-    # 3. Treina modelos (experimentos)
-    model_xgb, metrics_xgb = treinar_modelo_xgb(X_train, y_train, X_test, y_test)
-    model_rf, metrics_rf = treinar_modelo_rf(X_train, y_train, X_test, y_test)
+    # 3. Treina modelos (experimentos) em paralelo, um processo por modelo,
+    #    cada um com metade dos núcleos (sem disputa de CPU entre eles)
+    n_jobs = max(1, (os.cpu_count() or 2) // 2)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        future_xgb = executor.submit(treinar_modelo_xgb, X_train, y_train, X_test, y_test, n_jobs=n_jobs)
+        future_rf = executor.submit(treinar_modelo_rf, X_train, y_train, X_test, y_test, n_jobs=n_jobs)
+        model_xgb, metrics_xgb = future_xgb.result()
+        model_rf, metrics_rf = future_rf.result()
     
     # 4. Registra no MLflow (rastreabilidade)
     registra_mlflow_gcp_xgb(model_xgb, metrics_xgb, experiment_name="inadimplencia-xgb")
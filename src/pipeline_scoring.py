@@ -19,6 +19,7 @@ import sys
 from datetime import datetime
 from pathlib import Path
 import logging
+import joblib
 import pandas as pd
 import numpy as np
 import mlflow
@@ -38,20 +39,49 @@ from pre_processamento import (
     codificar_variaveis_categoricas,
     escalar_variaveis
 )
+from scoring_model_final import load_fil_model, load_registry_model, predict_fil, predict_native
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 log = logging.getLogger("pipeline-scoring")
 
 # Configurações
 MLFLOW_TRACKING_URI = os.path.join(PROJECT_DIR, "mlruns")
+# Colunas de data já convertidas na leitura do CSV (parse_dates)
+COLUNAS_DATA = ["Data_Contratacao", "Data_Vencimento_Fatura", "Data_Ingestao",
+                "Data_Atualizacao", "Data_Nascimento"]
 
 
-def preprocessar_para_scoring(df: pd.DataFrame) -> pd.DataFrame:
+def carregar_preprocessador(model_name: str, model_version: str) -> dict | None:
+    """
+    Carrega o pré-processador ajustado no treino (scaler + colunas finais):
+    primeiro do run do modelo no MLflow, depois do preprocessor.pkl local.
+    """
+    mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+    try:
+        from mlflow.tracking import MlflowClient
+        run_id = MlflowClient().get_model_version(model_name, model_version).run_id
+        path = mlflow.artifacts.download_artifacts(
+            run_id=run_id, artifact_path="preprocessor/preprocessor.pkl"
+        )
+        log.info(f"Pré-processador carregado do run {run_id}")
+        return joblib.load(path)
+    except Exception as e:
+        log.warning(f"Pré-processador não encontrado no MLflow ({e}).")
+    
+    local_path = os.path.join(PROJECT_DIR, "preprocessor.pkl")
+    if os.path.exists(local_path):
+        log.info(f"Pré-processador carregado de {local_path}")
+        return joblib.load(local_path)
+    return None
+
+
+def preprocessar_para_scoring(df: pd.DataFrame, preprocessor: dict | None = None) -> pd.DataFrame:
     """
     Aplica o mesmo pré-processamento usado no treino.
     
-    IMPORTANTE: Em produção, você salvaria o scaler/encoder do treino
-    e reutilizaria aqui para garantir consistência.
+    Com o preprocessor do treino, as colunas são alinhadas às do treino e o
+    scaler ajustado é só aplicado (transform). Sem ele, o scaler é reajustado
+    nos próprios dados de scoring (inconsistente com o treino).
     """
     log.info("Iniciando pré-processamento para scoring...")
     
@@ -61,14 +91,15 @@ def preprocessar_para_scoring(df: pd.DataFrame) -> pd.DataFrame:
                  "Data_Contratacao", "Data_Vencimento_Fatura", 
                  "Data_Ingestao", "Data_Atualizacao"]
     
-    # Guarda o ID antes de processar
-    id_cliente = df["ID_Cliente"].copy()
-    
     # Pipeline de pré-processamento
     df = tratar_valores_nulos(df)
     df = tratar_data_nascimento(df)
     df = df.set_index('ID_Cliente', drop=True)
-    df = converter_colunas_data(df, colunas_data)
+    # Datas já vêm como datetime do read_csv; só converte o que ainda for texto
+    pendentes = [c for c in colunas_data
+                 if c in df.columns and not pd.api.types.is_datetime64_any_dtype(df[c])]
+    if pendentes:
+        df = converter_colunas_data(df, pendentes)
     df = calcular_tempo_assinatura(df)
     df = calcular_tempo_atraso_fatura(df)
     
@@ -82,9 +113,20 @@ def preprocessar_para_scoring(df: pd.DataFrame) -> pd.DataFrame:
     if "Status_Pagamento" in df.columns:
         df = df.drop(columns=["Status_Pagamento"])
     
-    # Escala variáveis numéricas
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-    df = escalar_variaveis(df, numeric_cols)
+    if preprocessor is not None:
+        # Mesmas colunas do treino (dummies ausentes = 0) e scaler do treino
+        df = df.reindex(columns=preprocessor["feature_cols"], fill_value=0)
+        df = escalar_variaveis(df, preprocessor["numeric_cols"], preprocessor["scaler"])
+    else:
+        log.warning("Pré-processador do treino indisponível: reajustando o scaler nos dados de scoring.")
+        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+        df = escalar_variaveis(df, numeric_cols)
+    
+    # Mesmos dtypes do treino (float32/int32), sem cópias float64 no predict
+    df = df.astype(
+        {c: "float32" for c in df.select_dtypes("float64").columns}
+        | {c: "int32" for c in df.select_dtypes("int64").columns}
+    )
     
     log.info(f"Pré-processamento concluído. Shape: {df.shape}")
     return df
@@ -97,20 +139,31 @@ def carregar_modelo(model_name: str, model_version: str):
     uri = f"models:/{model_name}/{model_version}"
     log.info(f"Carregando modelo: {uri}")
     
-    model = mlflow.pyfunc.load_model(uri)
+    # Cache em processo + em disco (ver scoring_model_final.load_registry_model)
+    model = load_registry_model(model_name, model_version)
     return model
 
 
-def fazer_predicoes(model, df: pd.DataFrame) -> pd.DataFrame:
-    """Aplica o modelo e retorna predições com probabilidades."""
+def fazer_predicoes(model, df: pd.DataFrame, fil_model=None) -> pd.DataFrame:
+    """
+    Aplica o modelo e retorna predições com probabilidades.
+    Com fil_model (RAPIDS FIL), a inferência roda na GPU; senão, direto no
+    modelo sklearn/XGBoost (sem o pyfunc), com o pyfunc como último recurso.
+    """
     log.info("Gerando predições...")
     
-    # Predições
-    predictions = model.predict(df)
+    # Predições: GPU (FIL) -> modelo nativo -> pyfunc
+    fast = predict_fil(fil_model, df) or predict_native(model, df)
+    predictions = fast[0] if fast else model.predict(df)
     
     # Monta DataFrame de resultado
-    resultado = pd.DataFrame(index=df.index)
-    resultado["prediction"] = predictions
+    cols = {"prediction": np.asarray(predictions)}
+    
+    if fast and fast[1] is not None and fast[1].shape[1] == 2:
+        # Colunas copiadas: o DataFrame não mantém uma view do buffer N x 2
+        cols["prob_adimplente"] = fast[1][:, 0].copy()
+        cols["prob_inadimplente"] = fast[1][:, 1].copy()
+        return pd.DataFrame(cols, index=df.index, copy=False)
     
     # Tenta obter probabilidades
     try:
@@ -119,12 +172,12 @@ def fazer_predicoes(model, df: pd.DataFrame) -> pd.DataFrame:
         if hasattr(unwrapped_model, "predict_proba"):
             probas = unwrapped_model.predict_proba(df)
             if probas.shape[1] == 2:
-                resultado["prob_adimplente"] = probas[:, 0]
-                resultado["prob_inadimplente"] = probas[:, 1]
+                cols["prob_adimplente"] = probas[:, 0].copy()
+                cols["prob_inadimplente"] = probas[:, 1].copy()
     except Exception as e:
         log.warning(f"Não foi possível obter probabilidades: {e}")
     
-    return resultado
+    return pd.DataFrame(cols, index=df.index, copy=False)
 
 
 def main():
@@ -132,25 +185,32 @@ def main():
     parser.add_argument("--input", type=str, required=True, help="Caminho do CSV de entrada")
     parser.add_argument("--model-name", type=str, default="ModelRFC-GCP", help="Nome do modelo")
     parser.add_argument("--model-version", type=str, default="1", help="Versão do modelo")
-    parser.add_argument("--output", type=str, default=None, help="Caminho do CSV de saída")
+    parser.add_argument("--output", type=str, default=None, help="Caminho do arquivo de saída")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet", help="Formato das predições")
+    parser.add_argument("--use-gpu", type=str, default="true", help="true/false (RAPIDS FIL; cai para CPU sem GPU)")
     args = parser.parse_args()
     
     # 1. Carrega dados brutos
     log.info(f"Carregando dados de: {args.input}")
-    df_raw = pd.read_csv(args.input)
+    # parse_dates só com as colunas de data presentes no cabeçalho (senão ValueError)
+    header = pd.read_csv(args.input, nrows=0).columns
+    datas = [c for c in COLUNAS_DATA if c in header]
+    ausentes = [c for c in COLUNAS_DATA if c not in header]
+    if ausentes:
+        log.warning(f"Colunas de data ausentes no arquivo: {ausentes}")
+    df_raw = pd.read_csv(args.input, engine="pyarrow", parse_dates=datas)
     log.info(f"Dados carregados: {df_raw.shape}")
     
-    # Guarda IDs originais
-    ids_originais = df_raw["ID_Cliente"].copy()
-    
-    # 2. Pré-processa
-    df_processed = preprocessar_para_scoring(df_raw)
+    # 2. Pré-processa (com o scaler/colunas salvos no treino)
+    preprocessor = carregar_preprocessador(args.model_name, args.model_version)
+    df_processed = preprocessar_para_scoring(df_raw, preprocessor)
     
     # 3. Carrega modelo
     model = carregar_modelo(args.model_name, args.model_version)
     
-    # 4. Faz predições
-    resultado = fazer_predicoes(model, df_processed)
+    # 4. Faz predições (GPU via RAPIDS FIL, se disponível)
+    fil_model = load_fil_model(model, batch_size=len(df_processed)) if args.use_gpu.lower() == "true" else None
+    resultado = fazer_predicoes(model, df_processed, fil_model=fil_model)
     
     # 5. Adiciona ID de volta
     resultado = resultado.reset_index()
@@ -160,20 +220,26 @@ def main():
         output_path = args.output
     else:
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_path = os.path.join(PROJECT_DIR, f"predicoes_{ts}.csv")
+        output_path = os.path.join(PROJECT_DIR, f"predicoes_{ts}.{args.format}")
     
-    resultado.to_csv(output_path, index=False)
+    if args.format == "csv":
+        resultado.to_csv(output_path, index=False)
+    else:
+        resultado.to_parquet(output_path, engine="pyarrow", compression="snappy", index=False)
     log.info(f"Predições salvas em: {output_path}")
     
     # 7. Mostra resumo
     print("\n" + "="*50)
     print("RESUMO DAS PREDIÇÕES")
     print("="*50)
-    print(f"Total de clientes: {len(resultado)}")
-    print(f"Preditos como Adimplentes (0): {(resultado['prediction'] == 0).sum()}")
-    print(f"Preditos como Inadimplentes (1): {(resultado['prediction'] == 1).sum()}")
+    # Contagens direto no ndarray (sem Series intermediárias)
+    preds = resultado["prediction"].to_numpy()
+    print(f"Total de clientes: {preds.size}")
+    print(f"Preditos como Adimplentes (0): {int(np.count_nonzero(preds == 0))}")
+    print(f"Preditos como Inadimplentes (1): {int(np.count_nonzero(preds == 1))}")
     if "prob_inadimplente" in resultado.columns:
-        print(f"\nProbabilidade média de inadimplência: {resultado['prob_inadimplente'].mean():.2%}")
+        prob_media = float(np.nanmean(resultado["prob_inadimplente"].to_numpy()))
+        print(f"\nProbabilidade média de inadimplência: {prob_media:.2%}")
     print("="*50)
     
     return resultado
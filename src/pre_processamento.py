@@ -1,15 +1,18 @@
 import os
+import joblib
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import logging
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 
 # ==================== CONFIGURAÇÕES GCP ====================
 PROJECT_ID = "mlops-484912"
 BUCKET_NAME = "meu-bucket-29061999"
+GCS_CHUNK_SIZE = 32 * 1024 * 1024  # arquivos maiores sobem em partes paralelas
 
 # Configura logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -20,13 +23,22 @@ def carregar_dados(caminho: str) -> pd.DataFrame:
     Suporta caminhos locais ou GCS (gs://bucket/path).
     """
     logging.info(f'Carregando dados de {caminho}')
-    return pd.read_csv(caminho)
+    # Parser multi-thread do Arrow (dtypes numpy: o restante do pipeline usa np.number/object)
+    return pd.read_csv(caminho, engine='pyarrow')
 
 
 def carregar_dados_gcs(gcs_path: str) -> pd.DataFrame:
     """Carrega dados diretamente do Google Cloud Storage."""
+    import pyarrow.csv as pacsv
+    from pyarrow import fs as pafs
+
     logging.info(f'Carregando dados do GCS: {gcs_path}')
-    return pd.read_csv(gcs_path)
+    # GcsFileSystem nativo do Arrow + parser multi-thread; self_destruct libera
+    # a tabela Arrow durante a conversão (sem manter as duas cópias)
+    filesystem, path = pafs.FileSystem.from_uri(gcs_path)
+    with filesystem.open_input_stream(path) as stream:
+        table = pacsv.read_csv(stream)
+    return table.to_pandas(self_destruct=True)
 
 
 def upload_to_gcs(local_path: str, gcs_path: str):
@@ -34,7 +46,13 @@ def upload_to_gcs(local_path: str, gcs_path: str):
     client = storage.Client(project=PROJECT_ID)
     bucket = client.bucket(BUCKET_NAME)
     blob = bucket.blob(gcs_path)
-    blob.upload_from_filename(local_path)
+    if os.path.getsize(local_path) > GCS_CHUNK_SIZE:
+        # Arquivos grandes: partes enviadas em paralelo e compostas no GCS
+        transfer_manager.upload_chunks_concurrently(
+            local_path, blob, chunk_size=GCS_CHUNK_SIZE, max_workers=8
+        )
+    else:
+        blob.upload_from_filename(local_path)
     logging.info(f"Upload concluído: gs://{BUCKET_NAME}/{gcs_path}")
 
 def tratar_valores_nulos(df: pd.DataFrame) -> pd.DataFrame:
@@ -89,17 +107,18 @@ def converter_colunas_data(
     pd.DataFrame
         DataFrame com as colunas convertidas para datetime.
     """
-    df = df.copy()
+    convertidas = {}
     for coluna in colunas_data:
         if coluna in df.columns:
-            df[coluna] = pd.to_datetime(
+            convertidas[coluna] = pd.to_datetime(
                 df[coluna],
                 format=formato,
                 errors=erros,
             )
         else:
             print(f"A coluna '{coluna}' não existe no DataFrame.")
-    return df
+    # assign devolve um novo DataFrame de uma vez (sem copy() + setitem por coluna)
+    return df.assign(**convertidas)
 
 
 def calcular_tempo_assinatura(df, coluna_data="Data_Contratacao"):
@@ -120,7 +139,6 @@ def calcular_tempo_assinatura(df, coluna_data="Data_Contratacao"):
         - Tempo_Assinatura_Meses_Totais : int (quantidade total de meses de assinatura)
 
     """
-    df = df.copy()
     hoje = pd.to_datetime(datetime.today().date())
 
     # diferença em meses totais
@@ -130,9 +148,7 @@ def calcular_tempo_assinatura(df, coluna_data="Data_Contratacao"):
     ajuste = (hoje.day < df[coluna_data].dt.day).astype(int)
     meses_totais = meses_totais - ajuste
 
-    df["Tempo_Assinatura_Meses_Totais"] = meses_totais.astype(int)
-
-    return df
+    return df.assign(Tempo_Assinatura_Meses_Totais=meses_totais.astype(int))
 
 def calcular_tempo_atraso_fatura(
     df: pd.DataFrame,
@@ -151,8 +167,6 @@ def calcular_tempo_atraso_fatura(
       - Se vencimento ainda não chegou -> atraso = 0.
       - Meses aproximados = dias/30 (1 casa decimal).
     """
-    df = df.copy()
-
     hoje = pd.to_datetime(datetime.today().date())
 
     # Diferença em dias
@@ -167,9 +181,7 @@ def calcular_tempo_atraso_fatura(
     dias_atraso = np.where(ha_pendencia & (dias_diff > 0), dias_diff, 0).astype(int)
 
     # Colunas finais
-    df["Dias_Atraso_Fatura"] = dias_atraso
-
-    return df
+    return df.assign(Dias_Atraso_Fatura=dias_atraso)
 
 def codificar_variaveis_categoricas(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -241,16 +253,39 @@ def codificar_variaveis_categoricas(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
-def escalar_variaveis(df: pd.DataFrame, cols: list) -> pd.DataFrame:
-    """Escala variáveis numéricas."""
+def escalar_variaveis(df: pd.DataFrame, cols: list, scaler: StandardScaler = None) -> pd.DataFrame:
+    """
+    Escala variáveis numéricas.
+    Com um scaler já ajustado (o do treino), só aplica o transform.
+    """
     logging.info('Escalando variáveis numéricas')
-    scaler = StandardScaler()
-    df[cols] = scaler.fit_transform(df[cols])
+    if scaler is None:
+        scaler = StandardScaler()
+        df[cols] = scaler.fit_transform(df[cols])
+    else:
+        df[cols] = scaler.transform(df[cols])
     return df
 
 
-def pipeline_preprocessamento(caminho_csv, target, colunas_data, drop_cols=[]):
-    """Pipeline completo de pré-processamento."""
+def salvar_preprocessador(scaler: StandardScaler, numeric_cols: list, feature_cols: list, caminho: str):
+    """
+    Salva o pré-processamento ajustado no treino (scaler + colunas finais),
+    para o scoring aplicar exatamente a mesma transformação sem reajustar.
+    """
+    preprocessador = {
+        "scaler": scaler,
+        "numeric_cols": numeric_cols,
+        "feature_cols": feature_cols,
+    }
+    joblib.dump(preprocessador, caminho)
+    logging.info(f"Pré-processador salvo em {caminho}")
+
+
+def pipeline_preprocessamento(caminho_csv, target, colunas_data, drop_cols=[], preprocessor_path=None):
+    """
+    Pipeline completo de pré-processamento.
+    Com preprocessor_path, salva o scaler ajustado e as colunas finais.
+    """
     df = carregar_dados(caminho_csv)
     #print(df.head())
     df = tratar_valores_nulos(df)
@@ -277,7 +312,11 @@ def pipeline_preprocessamento(caminho_csv, target, colunas_data, drop_cols=[]):
     #print(df.head())
     numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
     numeric_cols = [c for c in numeric_cols if c != 'Inadimplente']
-    df = escalar_variaveis(df, numeric_cols)
+    scaler = StandardScaler().fit(df[numeric_cols])
+    df = escalar_variaveis(df, numeric_cols, scaler)
+    if preprocessor_path:
+        feature_cols = [c for c in df.columns if c != 'Inadimplente']
+        salvar_preprocessador(scaler, numeric_cols, feature_cols, preprocessor_path)
     logging.info('Pré-processamento finalizado')
     return df
 
@@ -290,24 +329,29 @@ import os
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 
-# Opção 1: Carregar do GCS (produção)
-# input_csv = f"gs://{BUCKET_NAME}/data/base_clientes_inadimplencia.csv"
-
-# Opção 2: Carregar local (desenvolvimento)
-input_csv = os.path.join(PROJECT_DIR, "data", "base_clientes_inadimplencia.csv")
+# Só roda como script (python src/pre_processamento.py): o pipeline_scoring e
+# os testes importam as funções sem reprocessar a base inteira
+if __name__ == "__main__":
+    # Opção 1: Carregar do GCS (produção)
+    # input_csv = f"gs://{BUCKET_NAME}/data/base_clientes_inadimplencia.csv"
 
-df = carregar_dados(input_csv)
-target = "Status_Pagamento"
-colunas_data = ["Data_Contratacao", "Data_Vencimento_Fatura", "Data_Ingestao", "Data_Atualizacao"] 
-drop_cols = ["Telefone", "Nome", "Email", "Data_Nascimento", "Data_Contratacao", "Data_Vencimento_Fatura", "Data_Ingestao", "Data_Atualizacao"]
+    # Opção 2: Carregar local (desenvolvimento)
+    input_csv = os.path.join(PROJECT_DIR, "data", "base_clientes_inadimplencia.csv")
 
-df_transformado = pipeline_preprocessamento(input_csv, target, colunas_data, drop_cols=drop_cols)
+    df = carregar_dados(input_csv)
+    target = "Status_Pagamento"
+    colunas_data = ["Data_Contratacao", "Data_Vencimento_Fatura", "Data_Ingestao", "Data_Atualizacao"] 
+    drop_cols = ["Telefone", "Nome", "Email", "Data_Nascimento", "Data_Contratacao", "Data_Vencimento_Fatura", "Data_Ingestao", "Data_Atualizacao"]
 
-# Salva dados processados localmente
-output_path = os.path.join(PROJECT_DIR, "df_transformado.csv")
-df_transformado.to_csv(output_path, index=True)
-logging.info(f"Dados processados salvos em {output_path}")
+    df_transformado = pipeline_preprocessamento(
+        input_csv, target, colunas_data, drop_cols=drop_cols,
+        preprocessor_path=os.path.join(PROJECT_DIR, "preprocessor.pkl")
+    )
 
-# (Opcional) Upload para GCS
-# upload_to_gcs("df_transformado.csv", "data/processed/df_transformado.csv")
+    # Salva dados processados localmente
+    output_path = os.path.join(PROJECT_DIR, "df_transformado.csv")
+    df_transformado.to_csv(output_path, index=True)
+    logging.info(f"Dados processados salvos em {output_path}")
 
+    # (Opcional) Upload para GCS
+    # upload_to_gcs("df_transformado.csv", "data/processed/df_transformado.csv")
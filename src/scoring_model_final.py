@@ -15,18 +15,26 @@ Este é um padrão comum em produção para processar grandes volumes de dados.
 """
 
 import argparse
+import functools
 import os
+import shutil
 import tempfile
+import warnings
+import weakref
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
 import logging
 import pandas as pd
 import numpy as np
 import mlflow
 from mlflow.exceptions import RestException
 
-from google.cloud import storage
-from google.cloud import aiplatform
+if TYPE_CHECKING:
+    import pyarrow.parquet as pq  # só para anotações; importado sob demanda
+
+# google.cloud.storage / aiplatform são importados nas funções que os usam:
+# o aiplatform sozinho leva ~1-2s para carregar (stubs gRPC)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 log = logging.getLogger("batch-scoring")
@@ -43,9 +51,20 @@ PROJECT_DIR = os.path.dirname(SCRIPT_DIR)
 # MLflow: usa tracking local (mesma pasta do model_registry.py)
 MLFLOW_TRACKING_URI = os.path.join(PROJECT_DIR, "mlruns")
 
+# Cache em disco dos artifacts de modelos (versões numéricas são imutáveis)
+MODEL_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "mlflow_models"
+
+# Transferências com o GCS em chunks de 32 MiB (menos requisições por arquivo);
+# arquivos maiores que isso sobem em partes paralelas
+GCS_CHUNK_SIZE = 32 * 1024 * 1024
+os.environ.setdefault("MLFLOW_GCS_DOWNLOAD_CHUNK_SIZE", str(GCS_CHUNK_SIZE))
+os.environ.setdefault("MLFLOW_GCS_UPLOAD_CHUNK_SIZE", str(GCS_CHUNK_SIZE))
+
 # -------------------- INICIALIZAÇÃO GCP --------------------
 def init_gcp():
     """Inicializa conexão com GCP e configura MLflow."""
+    from google.cloud import aiplatform
+
     aiplatform.init(
         project=PROJECT_ID,
         location=REGION,
@@ -57,9 +76,40 @@ def init_gcp():
 
 def get_gcs_client():
     """Retorna cliente do Google Cloud Storage."""
+    from google.cloud import storage
+
     return storage.Client(project=PROJECT_ID)
 
 # -------------------- LOAD DO MODELO --------------------
+@functools.lru_cache(maxsize=4)
+def load_registry_model(model_name: str, stage_or_version: str):
+    """
+    Carrega modelo do MLflow Registry, uma vez por processo.
+    
+    Versões numéricas ficam em cache em disco ($XDG_CACHE_HOME/mlflow_models/<nome>/<versão>),
+    então execuções seguintes não baixam os artifacts de novo. Stages
+    (ex.: Production) mudam de versão e são sempre resolvidos no Registry.
+    """
+    uri = f"models:/{model_name}/{stage_or_version}"
+    if not stage_or_version.isdigit():
+        return mlflow.pyfunc.load_model(uri)
+
+    cache_dir = MODEL_CACHE_DIR / model_name / stage_or_version
+    mlmodel = next(cache_dir.rglob("MLmodel"), None) if cache_dir.exists() else None
+    if mlmodel is None:
+        # Baixa para um diretório temporário e renomeia: sem cache parcial
+        tmp_dir = cache_dir.with_name(f"{cache_dir.name}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        mlflow.artifacts.download_artifacts(artifact_uri=uri, dst_path=str(tmp_dir))
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        tmp_dir.rename(cache_dir)
+        mlmodel = next(cache_dir.rglob("MLmodel"))
+        log.info(f"Artifacts do modelo em cache: {cache_dir}")
+
+    return mlflow.pyfunc.load_model(str(mlmodel.parent))
+
+
 def _load_from_registry(model_name: str, stage_or_version: str):
     """
     Carrega modelo do MLflow Registry.
@@ -70,7 +120,7 @@ def _load_from_registry(model_name: str, stage_or_version: str):
     """
     uri = f"models:/{model_name}/{stage_or_version}"
     log.info(f"Carregando modelo do MLflow Registry: {uri}")
-    return mlflow.pyfunc.load_model(uri)
+    return load_registry_model(model_name, stage_or_version)
 
 
 def _load_from_gcs(model_path: str):
@@ -98,25 +148,232 @@ def load_model_resiliente(model_name: str, stage_or_version: str):
     gcs_path = f"gs://{BUCKET_NAME}/mlflow/models/{model_name}/{stage_or_version}"
     return _load_from_gcs(gcs_path)
 
+# -------------------- INFERÊNCIA NA GPU (RAPIDS FIL) --------------------
+class FilModel:
+    """
+    Modelo de árvores (RandomForest/XGBoost) carregado no RAPIDS FIL (cuML).
+    predict_proba e classes_ seguem o formato do sklearn.
+    """
+
+    def __init__(self, fil, classes, feature_names=None):
+        self.fil = fil
+        self.classes_ = classes
+        self.feature_names = feature_names
+
+    def predict_proba(self, X) -> np.ndarray:
+        import cupy
+
+        # Entrada posicional: mesma ordem de colunas do treino
+        if self.feature_names is not None and isinstance(X, pd.DataFrame):
+            X = X[list(self.feature_names)]
+        # Entrada já na GPU (float32 contíguo): uma cópia H2D, um kernel
+        X_gpu = cupy.asarray(np.ascontiguousarray(X, dtype=np.float32))
+        return cupy.asnumpy(self.fil.predict_proba(X_gpu))
+
+
+def _native_model(pyfunc_model):
+    """Modelo sklearn/XGBoost por trás do wrapper pyfunc do MLflow (ou None)."""
+    impl = getattr(pyfunc_model, "_model_impl", None)
+    for attr in ("sklearn_model", "xgb_model"):
+        native = getattr(impl, attr, None)
+        if native is not None:
+            return native
+    return None
+
+
+def load_fil_model(pyfunc_model, batch_size: int) -> FilModel | None:
+    """
+    Carrega o modelo no RAPIDS FIL para scoring na GPU.
+    Retorna None (scoring segue na CPU) se não houver cuML/GPU
+    ou se o modelo não for um ensemble de árvores suportado.
+    """
+    native = _native_model(pyfunc_model)
+    if native is None:
+        return None
+    try:
+        from cuml import ForestInference
+    except ImportError:
+        log.info("cuML não disponível. Scoring na CPU.")
+        return None
+
+    try:
+        if type(native).__module__.startswith("xgboost"):
+            booster = native.get_booster() if hasattr(native, "get_booster") else native
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "model.ubj")
+                booster.save_model(path)
+                fil = ForestInference.load(path, output_class=True, model_type="xgboost_ubj")
+        else:
+            fil = ForestInference.load_from_sklearn(native, output_class=True)
+
+        # Ajusta layout/chunk size do FIL para o tamanho do lote
+        if hasattr(fil, "optimize"):
+            fil.optimize(batch_size=batch_size)
+    except Exception as e:
+        log.warning(f"FIL indisponível ({e}). Scoring na CPU.")
+        return None
+
+    log.info("Modelo carregado no RAPIDS FIL (GPU).")
+    if type(native).__module__.startswith("xgboost"):
+        feature_names = booster.feature_names
+    else:
+        feature_names = getattr(native, "feature_names_in_", None)
+    return FilModel(fil, getattr(native, "classes_", None), feature_names)
+
+
+def _predict_wrapped(wrapped, X, nome: str) -> tuple[np.ndarray, np.ndarray] | None:
+    """Predições (argmax mapeado em classes_) e probabilidades; None se falhar."""
+    try:
+        proba = wrapped.predict_proba(X)
+        idx = proba.argmax(axis=1)
+        classes = wrapped.classes_
+        return (np.asarray(classes)[idx] if classes is not None else idx), proba
+    except Exception as e:
+        log.warning(f"Scoring via {nome} falhou ({e}). Usando o próximo caminho.")
+        return None
+
+
+def predict_fil(fil_model: FilModel | None, X) -> tuple[np.ndarray, np.ndarray] | None:
+    """Predições e probabilidades na GPU; None se não houver FIL ou se falhar."""
+    if fil_model is None:
+        return None
+    return _predict_wrapped(fil_model, X, "GPU (FIL)")
+
+# -------------------- MODELO COMPILADO (TREELITE) --------------------
+class CompiledModel:
+    """
+    RandomForest compilado em C (Treelite/TL2cgen) pelo model_registry.py.
+    predict_proba e classes_ seguem o formato do sklearn.
+    """
+
+    def __init__(self, predictor, classes, feature_names=None):
+        self.predictor = predictor
+        self.classes_ = classes
+        self.feature_names = feature_names
+
+    def predict_proba(self, X) -> np.ndarray:
+        import tl2cgen
+
+        if self.feature_names is not None and isinstance(X, pd.DataFrame):
+            X = X[list(self.feature_names)]
+        X32 = np.ascontiguousarray(X, dtype=np.float32)
+        # Saída (linhas, alvos, classes) -> (linhas, classes)
+        proba = np.asarray(self.predictor.predict(tl2cgen.DMatrix(X32))).reshape(len(X32), -1)
+        if proba.shape[1] == 1:
+            proba = np.column_stack([1 - proba[:, 0], proba[:, 0]])
+        return proba
+
+
+def load_compiled_model(pyfunc_model) -> CompiledModel | None:
+    """
+    Carrega o .so do RandomForest compilado (artifact compiled/rf_predict.so
+    do run do modelo). None se não houver tl2cgen ou o artifact.
+    """
+    native = _native_model(pyfunc_model)
+    run_id = getattr(getattr(pyfunc_model, "metadata", None), "run_id", None)
+    if native is None or run_id is None or type(native).__module__.startswith("xgboost"):
+        return None
+    try:
+        import tl2cgen
+    except ImportError:
+        return None
+
+    try:
+        libpath = mlflow.artifacts.download_artifacts(run_id=run_id, artifact_path="compiled/rf_predict.so")
+        predictor = tl2cgen.Predictor(libpath)
+    except Exception as e:
+        log.info(f"Modelo compilado indisponível ({e}).")
+        return None
+
+    log.info(f"Modelo compilado (Treelite) carregado: {libpath}")
+    return CompiledModel(predictor, getattr(native, "classes_", None), getattr(native, "feature_names_in_", None))
+
+
+def predict_compiled(compiled_model: CompiledModel | None, X) -> tuple[np.ndarray, np.ndarray] | None:
+    """Predições e probabilidades no modelo compilado; None se não houver ou se falhar."""
+    if compiled_model is None:
+        return None
+    return _predict_wrapped(compiled_model, X, "modelo compilado")
+
+# -------------------- INFERÊNCIA NO MODELO NATIVO (CPU) --------------------
+def predict_native(pyfunc_model, X) -> tuple[np.ndarray, np.ndarray | None] | None:
+    """
+    Predições direto no modelo sklearn/XGBoost, sem o pyfunc (que valida
+    o schema do DataFrame a cada chamada). A entrada vira float32 contíguo;
+    no XGBoost usa booster.inplace_predict (sem montar DMatrix).
+    Retorna (preds, probas ou None), ou None para seguir pelo pyfunc.
+    """
+    native = _native_model(pyfunc_model)
+    if native is None:
+        return None
+    is_xgb = type(native).__module__.startswith("xgboost")
+    booster = (native.get_booster() if hasattr(native, "get_booster") else native) if is_xgb else None
+    try:
+        # Sem o pyfunc, a ordem das colunas é garantida aqui (array é posicional)
+        names = booster.feature_names if is_xgb else getattr(native, "feature_names_in_", None)
+        if names is not None and isinstance(X, pd.DataFrame):
+            X = X[list(names)]
+        X32 = np.ascontiguousarray(X, dtype=np.float32)
+
+        if is_xgb:
+            proba = booster.inplace_predict(X32)
+            if proba.ndim == 1:  # binary:logistic -> P(classe 1)
+                proba = np.column_stack([1 - proba, proba])
+        elif hasattr(native, "predict_proba"):
+            # Array sem nomes de colunas: o aviso do sklearn sobre feature names não se aplica
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                proba = native.predict_proba(X32)
+        else:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                return native.predict(X32), None
+    except Exception as e:
+        log.warning(f"Predição no modelo nativo falhou ({e}). Usando pyfunc.")
+        return None
+
+    idx = proba.argmax(axis=1)
+    classes = getattr(native, "classes_", None)
+    return (np.asarray(classes)[idx] if classes is not None else idx), proba
+
 # -------------------- DADOS / SCORING --------------------
-def load_dataframe_from_gcs(gcs_path: str) -> pd.DataFrame:
+def load_dataframe_from_gcs(gcs_path: str, chunksize: int | None = None):
     """
     Carrega DataFrame diretamente do GCS.
     Suporta paths como: gs://bucket/path/file.csv
+    
+    Com chunksize, retorna um iterador de DataFrames (leitura em streaming).
     """
     log.info(f"Lendo CSV do GCS: {gcs_path}")
-    df = pd.read_csv(gcs_path)
+    if chunksize:
+        return pd.read_csv(gcs_path, chunksize=chunksize)
+
+    import pyarrow.csv as pacsv
+    from pyarrow import fs as pafs
+
+    # GcsFileSystem nativo do Arrow + parser multi-thread; self_destruct
+    # libera a tabela Arrow durante a conversão para pandas
+    filesystem, path = pafs.FileSystem.from_uri(gcs_path)
+    with filesystem.open_input_stream(path) as stream:
+        table = pacsv.read_csv(stream)
+    df = table.to_pandas(self_destruct=True)
     log.info(f"Shape: {df.shape}")
     return df
 
 
-def load_dataframe_from_local_csv(csv_path: str | Path) -> pd.DataFrame:
-    """Carrega DataFrame de arquivo local."""
+def load_dataframe_from_local_csv(csv_path: str | Path, chunksize: int | None = None):
+    """
+    Carrega DataFrame de arquivo local.
+    Com chunksize, retorna um iterador de DataFrames (leitura em streaming).
+    """
     csv_path = Path(csv_path).resolve()
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV não encontrado: {csv_path}")
     log.info(f"Lendo CSV local: {csv_path}")
-    df = pd.read_csv(csv_path)
+    if chunksize:
+        return pd.read_csv(csv_path, chunksize=chunksize)
+    # Arquivo inteiro: parser multi-thread do Arrow (o engine pyarrow não lê em chunks)
+    df = pd.read_csv(csv_path, engine="pyarrow")
     log.info(f"Shape: {df.shape}")
     return df
 
@@ -136,43 +393,52 @@ def _align_dataframe_to_features(df: pd.DataFrame, expected_cols: list[str], id_
             raise KeyError(f"Coluna de ID '{c}' não encontrada.")
         ids_out[c] = df[c]
 
-    work = df.drop(columns=id_cols, errors="ignore").copy()
-    for col in ["target", "label", "inadimplente", "Status_Pagamento"]:
-        if col in work.columns:
-            work = work.drop(columns=[col])
+    work = df.drop(columns=id_cols, errors="ignore")
+    work = work.drop(columns=["target", "label", "inadimplente", "Status_Pagamento"], errors="ignore")
 
-    extras = [c for c in work.columns if c not in expected_cols]
+    expected_set = set(expected_cols)
+    extras = [c for c in work.columns if c not in expected_set]
     if extras:
         log.warning(f"Removendo colunas não vistas no treino: {extras}")
-        work = work.drop(columns=extras)
 
     missing = [c for c in expected_cols if c not in work.columns]
     if missing:
         log.warning(f"Criando colunas faltantes com 0: {missing}")
-        for c in missing:
-            work[c] = 0
-
-    work = work[expected_cols]
 
-    # Tentativa leve de coerção numérica
-    for c in work.columns:
-        if work[c].dtype == "object":
-            try:
-                work[c] = pd.to_numeric(work[c], errors="raise")
-            except Exception:
-                work[c] = work[c].astype(str)
-        if np.issubdtype(work[c].dtype, np.integer):
-            work[c] = work[c].astype("float64")
+    # Uma única realocação: descarta extras, ordena e cria as faltantes com 0
+    work = work.reindex(columns=expected_cols, fill_value=0)
+
+    # Coerção numérica só das colunas não numéricas (object ou str do pandas 3);
+    # valores inválidos viram 0, com aviso das colunas afetadas
+    text_cols = work.select_dtypes(exclude=["number", "bool"]).columns
+    if len(text_cols):
+        coerced = work[text_cols].apply(pd.to_numeric, errors="coerce")
+        invalid = coerced.isna() & work[text_cols].notna()
+        bad_cols = invalid.columns[invalid.any()].tolist()
+        if bad_cols:
+            log.warning(f"Valores não numéricos convertidos para 0 nas colunas: {bad_cols}")
+        work[text_cols] = coerced.fillna(0)
+    work = work.astype("float32", copy=False)
 
     return work, ids_out
 
-def score_dataframe(model, df: pd.DataFrame, id_cols: list[str]) -> pd.DataFrame:
+# Features esperadas por modelo (objeto -> lista ou None), resolvidas uma vez
+# Chave fraca: a entrada some junto com o modelo (ex.: evicção do lru_cache de
+# load_registry_model), sem reaproveitar resultado de outro modelo pelo id()
+_EXPECTED_FEATURES_CACHE: "weakref.WeakKeyDictionary[object, list[str] | None]" = weakref.WeakKeyDictionary()
+
+
+def get_expected_features(model) -> list[str] | None:
     """
-    Aplica o modelo nos dados e retorna predições.
-    
-    IMPORTANTE: Os dados de entrada precisam passar pelo mesmo
-    pré-processamento usado no treino!
+    Features esperadas pelo modelo: assinatura do MLflow -> sklearn
+    feature_names_in_ -> python_model. O resultado fica em cache por modelo,
+    então o scoring em chunks não repete a introspecção.
     """
+    try:
+        return _EXPECTED_FEATURES_CACHE[model]
+    except (KeyError, TypeError):
+        pass
+
     # Tenta obter features esperadas do modelo
     expected = _expected_feature_names_from_signature(model)
     
@@ -190,66 +456,140 @@ def score_dataframe(model, df: pd.DataFrame, id_cols: list[str]) -> pd.DataFrame
                 expected = list(unwrapped.feature_names_in_)
         except:
             pass
+
+    expected = expected or None
+    try:
+        _EXPECTED_FEATURES_CACHE[model] = expected
+    except TypeError:
+        pass  # objeto sem suporte a weakref: só não fica em cache
+    return expected
+
+
+def score_dataframe(model, df: pd.DataFrame, id_cols: list[str], fil_model: FilModel | None = None,
+                    expected: list[str] | None = None,
+                    compiled_model: CompiledModel | None = None) -> pd.DataFrame:
+    """
+    Aplica o modelo nos dados e retorna predições.
+    Com fil_model (RAPIDS FIL), predict/predict_proba rodam na GPU;
+    com compiled_model (Treelite), no RandomForest compilado em C.
+    expected: features do modelo (get_expected_features), calculadas uma vez fora do loop.
+    
+    IMPORTANTE: Os dados de entrada precisam passar pelo mesmo
+    pré-processamento usado no treino!
+    """
+    if expected is None:
+        expected = get_expected_features(model)
     
     if not expected:
         # Último recurso: usa todas as colunas numéricas exceto ID e target
         log.warning("Não foi possível identificar features do modelo. Usando todas as colunas numéricas.")
-        work = df.drop(columns=id_cols, errors="ignore").copy()
-        for col in ["target", "label", "inadimplente", "Status_Pagamento"]:
-            if col in work.columns:
-                work = work.drop(columns=[col])
+        # drop já retorna um novo DataFrame: sem .copy() extra
+        work = df.drop(columns=id_cols + ["target", "label", "inadimplente", "Status_Pagamento"], errors="ignore")
         
         # Guarda IDs
-        ids_out = pd.DataFrame(index=df.index)
-        for c in id_cols:
-            if c in df.columns:
-                ids_out[c] = df[c]
+        cols = {c: df[c].to_numpy() for c in id_cols if c in df.columns}
         
         # Usa apenas colunas numéricas
         numeric_cols = work.select_dtypes(include=[np.number]).columns.tolist()
         X = work[numeric_cols]
         
-        preds = model.predict(X)
-        out = ids_out.reset_index(drop=True)
-        out["prediction"] = preds
+        # GPU (FIL) -> compilado (Treelite) -> modelo nativo -> pyfunc
+        fast = predict_fil(fil_model, X) or predict_compiled(compiled_model, X) or predict_native(model, X)
+        preds = fast[0] if fast else model.predict(X)
+        cols["prediction"] = np.asarray(preds)
         
         try:
-            if hasattr(model, "predict_proba"):
-                proba = model.predict_proba(X)
-                if proba.shape[1] == 2:
-                    out["probability_inadimplente"] = proba[:, 1]
+            if fast or hasattr(model, "predict_proba"):
+                proba = fast[1] if fast else model.predict_proba(X)
+                if proba is not None and proba.shape[1] == 2:
+                    cols["probability_inadimplente"] = np.asarray(proba)[:, 1]
         except:
             pass
         
-        return out
+        return pd.DataFrame(cols, copy=False)
 
     # Fluxo normal com features conhecidas
     X, ids_out = _align_dataframe_to_features(df, expected_cols=expected, id_cols=id_cols)
 
-    preds = model.predict(X)
-    out = ids_out.reset_index(drop=True)
+    # GPU (FIL) -> compilado (Treelite) -> modelo nativo -> pyfunc
+    fast = predict_fil(fil_model, X) or predict_compiled(compiled_model, X) or predict_native(model, X)
+    preds = fast[0] if fast else model.predict(X)
 
+    # Saída montada uma vez a partir de arrays (sem concat/reset_index)
+    cols = {c: ids_out[c].to_numpy() for c in ids_out.columns}
     if isinstance(preds, pd.DataFrame):
-        out = pd.concat([out, preds.add_prefix("pred_").reset_index(drop=True)], axis=1)
+        cols.update({f"pred_{c}": preds[c].to_numpy() for c in preds.columns})
     else:
-        out["prediction"] = preds
+        cols["prediction"] = np.asarray(preds)
 
     try:
-        if hasattr(model, "predict_proba"):
-            proba = model.predict_proba(X)
-            proba_df = pd.DataFrame(proba)
-            proba_df.columns = [f"proba_class_{i}" for i in range(proba_df.shape[1])]
-            out = pd.concat([out, proba_df], axis=1)
+        proba = fast[1] if fast else (model.predict_proba(X) if hasattr(model, "predict_proba") else None)
+        if proba is not None:
+            proba = np.asarray(proba)
+            cols.update({f"proba_class_{i}": proba[:, i] for i in range(proba.shape[1])})
     except Exception:
         pass
 
-    return out
+    return pd.DataFrame(cols, copy=False)
 
-# -------------------- SALVAR CSV --------------------
-def save_predictions_csv(df_out: pd.DataFrame, input_csv_path: str, output_prefix: str) -> Path:
+# -------------------- SALVAR PREDIÇÕES --------------------
+def _normalize_predictions(df_out: pd.DataFrame, id_cols: list[str]) -> pd.DataFrame:
+    """
+    Tipos fixos por coluna para o schema do Parquet não depender do chunk:
+    IDs como string, prediction inteira como int64, probabilidades float64.
+    (o leitor em chunks pode inferir o mesmo ID como texto num chunk e int no outro)
+    """
+    dtypes = {c: "string" for c in id_cols if c in df_out.columns}
+    if "prediction" in df_out.columns and df_out["prediction"].dtype.kind in "iub":
+        dtypes["prediction"] = "int64"
+    dtypes.update({c: "float64" for c in df_out.columns if c.startswith(("proba_class_", "probability_"))})
+    return df_out.astype(dtypes)
+
+
+def save_predictions_parquet(df_out: pd.DataFrame, input_csv_path: str, output_prefix: str,
+                             writer=None, id_cols: list[str] | None = None) -> tuple[Path, "pq.ParquetWriter"]:
+    """
+    Salva as predições em Parquet (snappy) localmente.
+    Cada chamada grava um row group; passe o writer retornado para acrescentar
+    os próximos chunks e feche-o (writer.close()) ao final.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df_out = _normalize_predictions(df_out, id_cols or [])
+    if writer is not None:
+        writer.write_table(pa.Table.from_pandas(df_out, schema=writer.schema, preserve_index=False))
+        return Path(writer.where), writer
+
+    table = pa.Table.from_pandas(df_out, preserve_index=False)
+    ts = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    input_dir = Path(input_csv_path).resolve().parent
+    candidate_path = input_dir / f"{output_prefix}_{ts}.parquet"
+
+    try:
+        writer = pq.ParquetWriter(str(candidate_path), table.schema, compression="snappy")
+        log.info(f"Parquet salvo localmente: {candidate_path}")
+    except Exception as e:
+        log.warning(f"Não consegui salvar em {input_dir} ({e}). Usando ./outputs/ ...")
+        Path("outputs").mkdir(exist_ok=True)
+        candidate_path = Path("outputs") / f"{output_prefix}_{ts}.parquet"
+        writer = pq.ParquetWriter(str(candidate_path), table.schema, compression="snappy")
+        log.info(f"Parquet salvo em fallback: {candidate_path}")
+
+    writer.write_table(table)
+    return candidate_path, writer
+
+
+def save_predictions_csv(df_out: pd.DataFrame, input_csv_path: str, output_prefix: str,
+                         append_to: Path | None = None) -> Path:
     """
     Salva o CSV de predições localmente.
+    Com append_to, acrescenta as linhas (sem header) a um CSV já criado.
     """
+    if append_to is not None:
+        df_out.to_csv(append_to, mode="a", header=False, index=False, encoding="utf-8")
+        return append_to
+
     ts = datetime.utcnow().strftime("%Y%m%d%H%M%S")
     input_dir = Path(input_csv_path).resolve().parent
     candidate_path = input_dir / f"{output_prefix}_{ts}.csv"
@@ -282,7 +622,15 @@ def upload_predictions_to_gcs(local_path: str, gcs_folder: str = "predictions")
     gcs_path = f"{gcs_folder}/{filename}"
     
     blob = bucket.blob(gcs_path)
-    blob.upload_from_filename(local_path)
+    if os.path.getsize(local_path) > GCS_CHUNK_SIZE:
+        # CSVs grandes: partes enviadas em paralelo e compostas no GCS
+        from google.cloud.storage import transfer_manager
+
+        transfer_manager.upload_chunks_concurrently(
+            local_path, blob, chunk_size=GCS_CHUNK_SIZE, max_workers=8
+        )
+    else:
+        blob.upload_from_filename(local_path)
     
     full_path = f"gs://{BUCKET_NAME}/{gcs_path}"
     log.info(f"Upload para GCS concluído: {full_path}")
@@ -308,6 +656,9 @@ def main():
     parser.add_argument("--id-cols", nargs="*", default=["ID_Cliente"])
     parser.add_argument("--output-prefix", type=str, default="predicoes_inadimplencia")
     parser.add_argument("--upload-output", type=str, default="false", help="true/false")
+    parser.add_argument("--use-gpu", type=str, default="true", help="true/false (RAPIDS FIL; cai para CPU sem GPU)")
+    parser.add_argument("--chunksize", type=int, default=100_000, help="Linhas por chunk (0 = arquivo inteiro)")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet", help="Formato das predições")
     args = parser.parse_args()
 
     # 1. Inicializa GCP
@@ -317,17 +668,45 @@ def main():
     stage_or_version = args.registry_stage if args.registry_stage else args.model_version
     model = load_model_resiliente(args.model_name, stage_or_version)
 
-    # 3. Carrega dados
+    # 3. Carrega dados (em chunks: memória limitada a um chunk por vez)
+    chunksize = args.chunksize or None
     if args.input_csv.startswith("gs://"):
-        df_in = load_dataframe_from_gcs(args.input_csv)
+        chunks = load_dataframe_from_gcs(args.input_csv, chunksize=chunksize)
     else:
-        df_in = load_dataframe_from_local_csv(args.input_csv)
+        chunks = load_dataframe_from_local_csv(args.input_csv, chunksize=chunksize)
+    if chunksize is None:
+        chunks = [chunks]
     
-    # 4. Gera predições
-    df_out = score_dataframe(model, df_in, id_cols=args.id_cols)
-
-    # 5. Salva resultados
-    saved_path = save_predictions_csv(df_out, args.input_csv, args.output_prefix)
+    # 4-5. Gera predições chunk a chunk e grava incrementalmente
+    expected = get_expected_features(model)
+    fil_model = None
+    compiled_model = None
+    saved_path = None
+    parquet_writer = None
+    total = 0
+    try:
+        for df_in in chunks:
+            if saved_path is None:
+                if args.use_gpu.lower() == "true":
+                    # GPU via RAPIDS FIL, se disponível (ajustado ao tamanho do chunk)
+                    fil_model = load_fil_model(model, batch_size=len(df_in))
+                if fil_model is None:
+                    # CPU: RandomForest compilado pelo Treelite, se houver o artifact
+                    compiled_model = load_compiled_model(model)
+            df_out = score_dataframe(model, df_in, id_cols=args.id_cols, fil_model=fil_model,
+                                     expected=expected, compiled_model=compiled_model)
+            if args.format == "csv":
+                saved_path = save_predictions_csv(df_out, args.input_csv, args.output_prefix, append_to=saved_path)
+            else:
+                saved_path, parquet_writer = save_predictions_parquet(
+                    df_out, args.input_csv, args.output_prefix, writer=parquet_writer, id_cols=args.id_cols
+                )
+            total += len(df_out)
+    finally:
+        # Fecha o writer mesmo com erro no meio: o arquivo fica com footer válido
+        if parquet_writer is not None:
+            parquet_writer.close()
+    log.info(f"Linhas processadas: {total}")
 
     # 6. (Opcional) Upload para GCS
     if args.upload_output.lower() == "true":
@@ -0,0 +1,100 @@
+# tests/test_preprocessador.py
+# -*- coding: utf-8 -*-
+"""
+Testes do pré-processador salvo no treino (scaler + colunas finais).
+
+Boas práticas aplicadas:
+- Isolamento de I/O com tmp_path
+- Sem MLflow Registry real: o tracking aponta para uma pasta vazia e o
+  carregamento cai no preprocessor.pkl local
+- Verifica que o scoring reaproveita o scaler do treino (sem reajuste)
+"""
+from __future__ import annotations
+
+import importlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+
+
+# ---------- Fixtures utilitárias ----------
+
+@pytest.fixture()
+def pre(monkeypatch):
+    """Módulo src/pre_processamento.py (o pipeline só roda como script)."""
+    monkeypatch.syspath_prepend(str(SRC_DIR))
+    return importlib.import_module("pre_processamento")
+
+
+@pytest.fixture()
+def scoring(pre, tmp_path: Path, monkeypatch):
+    """Módulo src/pipeline_scoring.py com projeto e mlruns em tmp_path."""
+    module = importlib.import_module("pipeline_scoring")
+    monkeypatch.setattr(module, "PROJECT_DIR", str(tmp_path))
+    monkeypatch.setattr(module, "MLFLOW_TRACKING_URI", str(tmp_path / "mlruns"))
+    return module
+
+
+@pytest.fixture()
+def treino() -> pd.DataFrame:
+    return pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": [10.0, 20.0, 30.0], "Estado_SP": [1, 0, 1]})
+
+
+# ---------- escalar_variaveis ----------
+
+def test_escalar_variaveis_com_scaler_do_treino_so_aplica_transform(pre, treino):
+    scaler = StandardScaler().fit(treino[["a", "b"]])
+    media_treino = scaler.mean_.copy()
+
+    novos = pd.DataFrame({"a": [2.0, 4.0], "b": [20.0, 40.0]})
+    out = pre.escalar_variaveis(novos.copy(), ["a", "b"], scaler)
+
+    # Mesma transformação do treino (média 2/20), sem reajustar nos dados novos
+    esperado = (novos.to_numpy() - media_treino) / scaler.scale_
+    assert np.allclose(out[["a", "b"]].to_numpy(), esperado)
+    assert np.allclose(scaler.mean_, media_treino)
+
+
+def test_escalar_variaveis_sem_scaler_ajusta_nos_dados(pre):
+    df = pd.DataFrame({"a": [2.0, 4.0]})
+    out = pre.escalar_variaveis(df.copy(), ["a"])
+    assert np.allclose(out["a"].to_numpy(), [-1.0, 1.0])
+
+
+# ---------- salvar_preprocessador / carregar_preprocessador ----------
+
+def test_salvar_e_carregar_preprocessador_round_trip(pre, scoring, treino, tmp_path: Path):
+    scaler = StandardScaler().fit(treino[["a", "b"]])
+    feature_cols = ["a", "b", "Estado_SP"]
+    pre.salvar_preprocessador(scaler, ["a", "b"], feature_cols, str(tmp_path / "preprocessor.pkl"))
+
+    loaded = scoring.carregar_preprocessador("ModelRFC-GCP", "1")
+
+    assert loaded is not None
+    assert loaded["numeric_cols"] == ["a", "b"]
+    assert loaded["feature_cols"] == feature_cols
+    assert np.allclose(loaded["scaler"].mean_, scaler.mean_)
+    assert np.allclose(loaded["scaler"].scale_, scaler.scale_)
+
+
+def test_carregar_preprocessador_sem_artifact_nem_arquivo_retorna_none(scoring):
+    assert scoring.carregar_preprocessador("ModelRFC-GCP", "1") is None
+
+
+def test_feature_cols_batem_com_colunas_lidas_no_treino(pre, treino, tmp_path: Path, monkeypatch):
+    """O índice salvo em df_transformado.csv não pode virar feature ("Unnamed: 0")."""
+    df = treino.assign(Inadimplente=[0, 1, 0])
+    df.to_csv(tmp_path / "df_transformado.csv", index=True)
+
+    model_registry = importlib.import_module("model_registry")
+    monkeypatch.setattr(model_registry, "PROJECT_DIR", str(tmp_path))
+    lido = model_registry.carregar_dados()
+
+    feature_cols = [c for c in df.columns if c != "Inadimplente"]
+    assert [c for c in lido.columns if c != "Inadimplente"] == feature_cols